@@ -0,0 +1,135 @@
+"""
+Offline cache warmer for the most common profile buckets
+
+Usage:
+    python -m agents.cache_warmer --max-buckets 10 --workers 4
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+import argparse
+import json
+import logging
+import os
+import random
+
+from dotenv import load_dotenv
+
+from config import PROFILE_DISTRIBUTION_PATH, CACHE_WARMER_MAX_WORKERS, CACHE_WARMER_MAX_BUCKETS
+from agents.planner import FitnessPlanner
+from agents.model_router import ModelRouter, default_llm_factory
+from utils.plan_cache import PlanCache, profile_bucket, ROOT_DIR
+from utils.pdf_generator import create_fitness_plan_pdf
+
+
+def load_buckets(path=PROFILE_DISTRIBUTION_PATH) -> List[Tuple[str, Dict, int]]:
+    """
+    Aggregate the profile distribution file into (bucket, representative profile, count).
+    The representative is the most frequent profile within its bucket.
+    """
+    with open(ROOT_DIR / path) as f:
+        profiles = json.load(f)
+
+    counts = defaultdict(int)
+    representatives = {}
+    for profile in profiles:
+        bucket = profile_bucket(
+            profile["age"], profile["gender"], profile["activity_level"],
+            profile["goal"], profile.get("preferences", [])
+        )
+        count = profile.get("count", 1)
+        counts[bucket] += count
+        if bucket not in representatives or count > representatives[bucket].get("count", 1):
+            representatives[bucket] = profile
+
+    buckets = [(bucket, representatives[bucket], count) for bucket, count in counts.items()]
+    buckets.sort(key=lambda item: item[2], reverse=True)
+    return buckets
+
+
+def select_buckets(buckets, limit, sample=False, seed=None) -> List[Tuple[str, Dict, int]]:
+    """Take the top `limit` buckets, or a count-weighted sample without replacement"""
+    if not sample or len(buckets) <= limit:
+        return buckets[:limit]
+    rng = random.Random(seed)
+    remaining = list(buckets)
+    selected = []
+    while remaining and len(selected) < limit:
+        pick = rng.choices(range(len(remaining)), weights=[count for _, _, count in remaining])[0]
+        selected.append(remaining.pop(pick))
+    return selected
+
+
+def warm_bucket(planner: FitnessPlanner, cache: PlanCache, bucket, profile) -> bool:
+    """Generate and store the plan, schedule and PDF for one bucket"""
+    workout_plan, nutrition_plan = planner.generate_plan(
+        profile["age"], profile["gender"], profile["weight"], profile["height"],
+        profile["activity_level"], profile["goal"], profile.get("preferences", [])
+    )
+    if "Error" in workout_plan or "Error" in nutrition_plan:
+        logging.error(f"Plan generation failed for bucket {bucket}.")
+        return False
+    weekly_schedule = planner.generate_weekly_schedule(workout_plan, nutrition_plan)
+    if "Error" in weekly_schedule:
+        logging.error(f"Schedule generation failed for bucket {bucket}.")
+        return False
+    pdf = create_fitness_plan_pdf(workout_plan, nutrition_plan, weekly_schedule)
+    cache.put(bucket, workout_plan, nutrition_plan, weekly_schedule, pdf)
+    return True
+
+
+def warm_cache(planner: FitnessPlanner, cache: PlanCache, buckets, max_workers=CACHE_WARMER_MAX_WORKERS,
+               refresh=False) -> Dict:
+    """Warm the given buckets with at most `max_workers` generations in flight"""
+    summary = {"warmed": [], "skipped": [], "failed": []}
+    pending = []
+    for bucket, profile, _ in buckets:
+        if not refresh and bucket in cache:
+            summary["skipped"].append(bucket)
+        else:
+            pending.append((bucket, profile))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(warm_bucket, planner, cache, bucket, profile): bucket
+            for bucket, profile in pending
+        }
+        for future in as_completed(futures):
+            bucket = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                logging.error(f"Error warming bucket {bucket}: {e}")
+                ok = False
+            summary["warmed" if ok else "failed"].append(bucket)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate plans for the most common profile buckets.")
+    parser.add_argument("--distribution", default=PROFILE_DISTRIBUTION_PATH, help="Profile distribution JSON file")
+    parser.add_argument("--max-buckets", type=int, default=CACHE_WARMER_MAX_BUCKETS, help="Quota of buckets to warm")
+    parser.add_argument("--workers", type=int, default=CACHE_WARMER_MAX_WORKERS, help="Concurrent generations")
+    parser.add_argument("--sample", action="store_true", help="Sample buckets by frequency instead of taking the top ones")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for --sample")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate buckets that are already cached")
+    args = parser.parse_args()
+
+    load_dotenv()
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    if not google_api_key:
+        raise SystemExit("GOOGLE_API_KEY not found. Please set it in your .env file.")
+
+    # Template fallbacks are fine for a live user but must never be cached
+    router = ModelRouter(default_llm_factory(google_api_key), allow_local_fallback=False)
+    planner = FitnessPlanner(google_api_key=google_api_key, router=router)
+    buckets = select_buckets(load_buckets(args.distribution), args.max_buckets, args.sample, args.seed)
+    summary = warm_cache(planner, PlanCache(), buckets, args.workers, args.refresh)
+    print(
+        f"Warmed {len(summary['warmed'])}, skipped {len(summary['skipped'])} already cached, "
+        f"failed {len(summary['failed'])}."
+    )
+
+
+if __name__ == "__main__":
+    main()
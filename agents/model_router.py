@@ -0,0 +1,233 @@
+"""
+Latency-aware routing of planner calls to model tiers
+"""
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterator, List, Optional
+import threading
+import time
+import logging
+
+from config import (
+    MODEL_TIERS, CALL_TYPE_TIERS, FALLBACK_TIERS, JSON_CALL_TYPES,
+    LATENCY_SLO_SECONDS, ROUTER_WINDOW_SIZE, ROUTER_MIN_SAMPLES, ROUTER_MIN_LATENCY_SAMPLES, ROUTER_MAX_ERROR_RATE,
+    ROUTER_COOLDOWN_SECONDS
+)
+
+
+class AllBackendsFailedError(RuntimeError):
+    """Raised when every tier for a call failed and no local fallback was given"""
+
+
+class BackendStats:
+    """
+    Rolling error window for a single backend, plus a latency window per call
+    type (call types have different SLOs and very different response sizes)
+    """
+
+    def __init__(self, window_size=ROUTER_WINDOW_SIZE):
+        self.window_size = window_size
+        self._latencies = defaultdict(lambda: deque(maxlen=window_size))
+        self._errors = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.degraded_until = 0.0
+
+    def record(self, call_type, latency, ok):
+        with self._lock:
+            self.calls += 1
+            self._errors.append(0 if ok else 1)
+            if ok:
+                self._latencies[call_type].append(latency)
+            else:
+                self.failures += 1
+
+    def error_samples(self) -> int:
+        with self._lock:
+            return len(self._errors)
+
+    def latency_samples(self, call_type) -> int:
+        with self._lock:
+            return len(self._latencies[call_type])
+
+    def error_rate(self) -> float:
+        with self._lock:
+            return sum(self._errors) / len(self._errors) if self._errors else 0.0
+
+    def percentile(self, pct, call_type=None) -> float:
+        """Latency percentile for one call type, or across all of them"""
+        with self._lock:
+            if call_type is None:
+                ordered = sorted(latency for window in self._latencies.values() for latency in window)
+            else:
+                ordered = sorted(self._latencies[call_type])
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def is_degraded(self, now=None) -> bool:
+        return (now or time.monotonic()) < self.degraded_until
+
+    def degrade(self, cooldown):
+        """Take the backend out of rotation and start a fresh window for when it returns"""
+        with self._lock:
+            self.degraded_until = time.monotonic() + cooldown
+            self._errors.clear()
+            self._latencies.clear()
+
+
+def default_llm_factory(google_api_key):
+    """Build Gemini chat models for the configured tiers"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    def factory(model, temperature, json_mode, timeout=None, max_retries=None):
+        kwargs = {"google_api_key": google_api_key, "model": model, "temperature": temperature}
+        if json_mode:
+            kwargs["response_mime_type"] = "application/json"
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        if max_retries is not None:
+            kwargs["max_retries"] = max_retries
+        return ChatGoogleGenerativeAI(**kwargs)
+
+    return factory
+
+
+class ModelRouter:
+    """
+    Maps call types (workout, nutrition, schedule, adjustment, chat) to model tiers.
+
+    Each tier keeps its own rolling stats. A tier whose error rate exceeds the
+    ceiling (after `min_samples` calls), or whose rolling p95 for a call type
+    exceeds that call's latency SLO (after `min_latency_samples` successful
+    calls, so a single outlier is never the p95), is marked degraded for a cooldown
+    period and traffic moves down the fallback chain. When every tier fails
+    the caller's local fallback is used instead.
+    """
+
+    def __init__(self, llm_factory: Callable, tiers: Dict = None, call_type_tiers: Dict = None,
+                 fallback_tiers: Dict = None, latency_slos: Dict = None,
+                 max_error_rate=ROUTER_MAX_ERROR_RATE, cooldown=ROUTER_COOLDOWN_SECONDS,
+                 min_samples=ROUTER_MIN_SAMPLES, min_latency_samples=ROUTER_MIN_LATENCY_SAMPLES,
+                 allow_local_fallback=True):
+        self.llm_factory = llm_factory
+        self.tiers = tiers or MODEL_TIERS
+        self.call_type_tiers = call_type_tiers or CALL_TYPE_TIERS
+        self.fallback_tiers = FALLBACK_TIERS if fallback_tiers is None else fallback_tiers
+        self.latency_slos = latency_slos or LATENCY_SLO_SECONDS
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self.min_latency_samples = min_latency_samples
+        self.allow_local_fallback = allow_local_fallback
+        self._backends = {}
+        self._stats = {tier: BackendStats() for tier in self.tiers}
+        self.local_fallbacks = 0
+        self._lock = threading.Lock()
+
+    def _backend(self, tier, json_mode):
+        key = (tier, json_mode)
+        with self._lock:
+            if key not in self._backends:
+                settings = dict(self.tiers[tier])
+                if json_mode:
+                    # Deterministic output for structured responses
+                    settings["temperature"] = 0.0
+                self._backends[key] = self.llm_factory(json_mode=json_mode, **settings)
+            return self._backends[key]
+
+    def route(self, call_type) -> List[str]:
+        """Ordered tiers to try: healthy tiers along the fallback chain first"""
+        chain = []
+        tier = self.call_type_tiers.get(call_type)
+        while tier and tier not in chain:
+            chain.append(tier)
+            tier = self.fallback_tiers.get(tier)
+        now = time.monotonic()
+        healthy = [t for t in chain if not self._stats[t].is_degraded(now)]
+        return healthy + [t for t in chain if t not in healthy]
+
+    def _record(self, tier, call_type, latency, ok):
+        """Record a call and degrade the tier once its rolling window breaches a limit"""
+        stats = self._stats[tier]
+        stats.record(call_type, latency, ok)
+        slo = self.latency_slos.get(call_type)
+        reason = None
+        if stats.error_samples() >= self.min_samples and stats.error_rate() > self.max_error_rate:
+            reason = f"error rate {stats.error_rate():.0%}"
+        elif slo and stats.latency_samples(call_type) >= self.min_latency_samples:
+            p95 = stats.percentile(95, call_type)
+            if p95 > slo:
+                reason = f"{call_type} p95 latency {p95:.2f}s over {slo}s SLO"
+        if reason:
+            logging.warning(f"Model tier '{tier}' degraded: {reason}.")
+            stats.degrade(self.cooldown)
+
+    def invoke(self, call_type, prompt, fallback: Optional[Callable[[], str]] = None) -> str:
+        """Run a prompt on the best available tier and return the response text"""
+        json_mode = call_type in JSON_CALL_TYPES
+        for tier in self.route(call_type):
+            start = time.monotonic()
+            try:
+                response = self._backend(tier, json_mode).invoke(prompt)
+            except Exception as e:
+                self._record(tier, call_type, time.monotonic() - start, ok=False)
+                logging.error(f"Model tier '{tier}' failed for {call_type}: {e}")
+                continue
+            self._record(tier, call_type, time.monotonic() - start, ok=True)
+            return response.content
+        return self._local_fallback(call_type, fallback)
+
+    def stream(self, call_type, prompt, fallback: Optional[Callable[[], str]] = None) -> Iterator[str]:
+        """
+        Stream response text from the best available tier.
+        Failover only happens before the first chunk has been yielded.
+        """
+        json_mode = call_type in JSON_CALL_TYPES
+        for tier in self.route(call_type):
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in self._backend(tier, json_mode).stream(prompt):
+                    started = True
+                    yield chunk.content
+            except GeneratorExit:
+                # Caller stopped reading early, e.g. once a JSON object closed
+                self._record(tier, call_type, time.monotonic() - start, ok=True)
+                raise
+            except Exception as e:
+                self._record(tier, call_type, time.monotonic() - start, ok=False)
+                logging.error(f"Model tier '{tier}' failed while streaming {call_type}: {e}")
+                if started:
+                    raise
+                continue
+            self._record(tier, call_type, time.monotonic() - start, ok=True)
+            return
+        yield self._local_fallback(call_type, fallback)
+
+    def _local_fallback(self, call_type, fallback):
+        if fallback is None or not self.allow_local_fallback:
+            raise AllBackendsFailedError(f"No model tier available for {call_type}.")
+        logging.warning(f"All model tiers failed for {call_type}; using local fallback.")
+        with self._lock:
+            self.local_fallbacks += 1
+        return fallback()
+
+    def stats(self) -> Dict:
+        """Snapshot of per-tier health for logging or display"""
+        now = time.monotonic()
+        report = {
+            tier: {
+                "model": self.tiers[tier]["model"],
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "error_rate": round(stats.error_rate(), 3),
+                "p50_latency": round(stats.percentile(50), 3),
+                "p95_latency": round(stats.percentile(95), 3),
+                "degraded": stats.is_degraded(now),
+            }
+            for tier, stats in self._stats.items()
+        }
+        report["local_fallbacks"] = self.local_fallbacks
+        return report
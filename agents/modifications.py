@@ -0,0 +1,269 @@
+"""
+Parsing and application of plan modification responses
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+import json
+import logging
+
+PLAN_TYPES = ("workout", "nutrition", "schedule")
+TARGETS = ("day", "meal", "exercise", "general")
+CHANGE_TYPES = (
+    "remove", "add", "replace", "adjust", "adjust_duration",
+    "adjust_sets_reps", "suggest_alternative", "cannot_fulfill"
+)
+
+# Opening quote -> closing quote. Curly quotes and single quotes are common
+# LLM defects; all of them are normalised to plain JSON double quotes.
+_QUOTE_PAIRS = {'"': '"', "'": "'", "“": "”"}
+
+
+class ModificationParseError(ValueError):
+    """Raised when a response cannot be turned into a valid modification request"""
+
+
+@dataclass(frozen=True)
+class PlanModification:
+    target: str
+    value: str
+    change_type: str
+    details: str
+
+
+@dataclass(frozen=True)
+class ModificationRequest:
+    plan_type: str
+    modifications: List[PlanModification]
+    action: str = "modify_plan"
+
+
+class ModificationStreamParser:
+    """
+    Incremental parser for `modify_plan` responses.
+
+    Chunks are fed as they arrive from the model. Text before the first `{`
+    (prose, ```json / '''json fences) is skipped, and the object is normalised
+    on the fly (single/curly quotes, raw newlines inside strings, trailing
+    commas). As soon as the outermost object closes it is decoded and
+    validated, so the caller can stop streaming without waiting for trailing
+    text. If a candidate turns out not to be a valid `modify_plan` object
+    (e.g. a `{` in the model's prose), scanning resumes after that `{`.
+    """
+
+    def __init__(self):
+        self._reset()
+        self._error: Optional[ModificationParseError] = None
+        self._error_size = 0
+        self.result: Optional[ModificationRequest] = None
+
+    def _reset(self):
+        self._out = []
+        # Raw text of the current candidate, replayed if it fails
+        self._raw = []
+        self._depth = 0
+        self._quote = None
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, chunk: str) -> Optional[ModificationRequest]:
+        """Consume a chunk; returns the parsed request once the object is complete"""
+        text = chunk
+        while text is not None and not self.done:
+            text = self._scan(text)
+        return self.result
+
+    def _scan(self, text) -> Optional[str]:
+        """Scan `text`; returns the text to rescan when a candidate object fails"""
+        for i, char in enumerate(text):
+            if self._depth or char == "{":
+                self._raw.append(char)
+            if self._quote is not None:
+                self._feed_string_char(char)
+                continue
+            if self._depth == 0 and char != "{":
+                continue
+            out = self._out
+            if char == "`":
+                # Backticks never appear in JSON outside strings: a fence
+                # opened inside the candidate, so the candidate was prose
+                return self._fail(ModificationParseError("Code fence inside JSON candidate."), text[i + 1:])
+            if char in _QUOTE_PAIRS:
+                self._quote = _QUOTE_PAIRS[char]
+                out.append('"')
+            elif char in "{[":
+                self._depth += 1
+                out.append(char)
+            elif char in "}]":
+                while out and out[-1].isspace():
+                    out.pop()
+                if out and out[-1] == ",":
+                    out.pop()
+                out.append(char)
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        self.result = _validate(_decode("".join(out)))
+                    except ModificationParseError as e:
+                        return self._fail(e, text[i + 1:])
+                    return None
+            else:
+                out.append(char)
+        return None
+
+    def _fail(self, error, rest) -> str:
+        """Drop the current candidate and return the text after its opening `{`"""
+        # Rescans also try the nested objects of a failed candidate; report the
+        # error of the largest candidate, which is the one the model meant
+        if len(self._raw) > self._error_size:
+            self._error = error
+            self._error_size = len(self._raw)
+        retry = "".join(self._raw[1:]) + rest
+        self._reset()
+        return retry
+
+    def close(self) -> ModificationRequest:
+        """Return the parsed request, raising if the stream ended early"""
+        while not self.done and self._out:
+            # The stream ended inside a candidate, e.g. an apostrophe in prose
+            # opened a "string" that swallowed the real object: retry after its `{`
+            self.feed(self._fail(ModificationParseError("Response ended before the JSON object was complete."), ""))
+        if not self.done:
+            if self._error is not None:
+                raise self._error
+            raise ModificationParseError("No JSON object found in response.")
+        return self.result
+
+    def _feed_string_char(self, char):
+        out = self._out
+        if self._escape:
+            self._escape = False
+            # \' is legal inside single-quoted strings but not in JSON
+            out.append(char if char == "'" else "\\" + char)
+        elif char == "\\":
+            self._escape = True
+        elif char == self._quote:
+            self._quote = None
+            out.append('"')
+        elif char == '"':
+            out.append('\\"')
+        elif char == "\n":
+            out.append("\\n")
+        elif char == "\t":
+            out.append("\\t")
+        else:
+            out.append(char)
+
+
+def parse_modification_response(text: str) -> ModificationRequest:
+    """Parse a complete model response into a validated modification request"""
+    parser = ModificationStreamParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def _decode(payload: str) -> dict:
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError as e:
+        raise ModificationParseError(f"Malformed JSON in modification response: {e}") from e
+
+
+def _validate(data) -> ModificationRequest:
+    """Validate decoded JSON against the `modify_plan` schema"""
+    if not isinstance(data, dict):
+        raise ModificationParseError("Modification response is not a JSON object.")
+    action = str(data.get("action", "")).strip().lower()
+    if action != "modify_plan":
+        raise ModificationParseError(f"Unrecognized action: {action or 'missing'}.")
+    plan_type = str(data.get("plan_type", "")).strip().lower()
+    if plan_type not in PLAN_TYPES:
+        raise ModificationParseError(f"Unrecognized plan_type: {plan_type or 'missing'}.")
+    raw_modifications = data.get("modifications")
+    if isinstance(raw_modifications, dict):
+        raw_modifications = [raw_modifications]
+    if not isinstance(raw_modifications, list) or not raw_modifications:
+        raise ModificationParseError("Modification response has no modifications.")
+
+    modifications = []
+    for mod in raw_modifications:
+        if not isinstance(mod, dict):
+            raise ModificationParseError("Each modification must be a JSON object.")
+        change_type = str(mod.get("change_type", "")).strip().lower()
+        if change_type not in CHANGE_TYPES:
+            raise ModificationParseError(f"Unrecognized change_type: {change_type or 'missing'}.")
+        target = str(mod.get("target") or "general").strip().lower()
+        if target not in TARGETS:
+            target = "general"
+        modifications.append(PlanModification(
+            target=target,
+            value=str(mod.get("value") or "").strip(),
+            change_type=change_type,
+            details=str(mod.get("details") or "").strip(),
+        ))
+    return ModificationRequest(plan_type=plan_type, modifications=modifications)
+
+
+def apply_plan_modifications(request: ModificationRequest, current_workout_plan, current_nutrition_plan, current_weekly_schedule):
+    updated_workout_plan = current_workout_plan
+    updated_nutrition_plan = current_nutrition_plan
+    updated_weekly_schedule = current_weekly_schedule
+    feedback_message = []
+    plan_type = request.plan_type
+
+    for mod in request.modifications:
+        value = mod.value
+        change_type = mod.change_type
+        details = mod.details
+
+        if change_type == "cannot_fulfill":
+            feedback_message.append(f"Could not apply change: {details}")
+
+        elif plan_type == "workout":
+            if change_type == "adjust_duration":
+
+                if value in updated_workout_plan:
+                    updated_workout_plan = updated_workout_plan.replace(
+                        value, f"{value} ({details})"
+                    )
+                    feedback_message.append(f"Workout plan for {value} adjusted: {details}.")
+                else:
+                    feedback_message.append(f"Could not find '{value}' in workout plan to adjust.")
+            elif change_type == "suggest_alternative":
+                if value in updated_workout_plan:
+                    updated_workout_plan = updated_workout_plan.replace(
+                        value, details
+                    )
+                    feedback_message.append(f"Workout plan alternative for {value} suggested: {details}.")
+                else:
+                    feedback_message.append(f"Could not find '{value}' in workout plan to suggest alternative.")
+
+        elif plan_type == "nutrition":
+            if change_type == "suggest_alternative" or change_type == "remove" or change_type == "replace":
+
+                if value in updated_nutrition_plan:
+
+                    lines = updated_nutrition_plan.split('\n')
+                    for i, line in enumerate(lines):
+                        if value in line:
+                            if change_type == "remove":
+                                lines[i] = ""
+                                feedback_message.append(f"Nutrition meal '{value}' removed.")
+                            elif change_type == "suggest_alternative" or change_type == "replace":
+                                lines[i] = f"{details}"
+                                feedback_message.append(f"Nutrition meal '{value}' replaced with '{details}'.")
+                            break
+                    updated_nutrition_plan = '\n'.join([line for line in lines if line])
+                else:
+                    feedback_message.append(f"Could not find '{value}' in nutrition plan to suggest alternative/remove.")
+
+        elif plan_type == "schedule":
+            if change_type == "adjust":
+
+                updated_weekly_schedule += f"\n\nNote: {details}"
+                feedback_message.append(f"Weekly schedule adjusted: {details}.")
+
+    logging.info(f"Applied {len(request.modifications)} modification(s) to {plan_type} plan.")
+    return updated_workout_plan, updated_nutrition_plan, updated_weekly_schedule, "; ".join(feedback_message)
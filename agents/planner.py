@@ -4,19 +4,28 @@ Main planning agent for generating workout and nutrition plans
 from typing import Dict, List
 import json
 from pathlib import Path
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 from utils.tdee import calculate_tdee
+from agents.modifications import ModificationStreamParser, ModificationParseError
+from agents.model_router import ModelRouter, default_llm_factory
+from utils.plan_cache import profile_bucket
+from agents.template_plans import template_workout_plan, template_nutrition_plan, template_weekly_schedule
 from langchain_core.messages import HumanMessage, AIMessage
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Shown in the chat in place of a reply; load tests count these as failures
+CHAT_ERROR_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+MODIFICATION_ERROR_MESSAGE = "I couldn't turn that into a plan change. Please try rephrasing your request."
+
 class FitnessPlanner:
-    def __init__(self, google_api_key):
-        self.llm = ChatGoogleGenerativeAI(google_api_key=google_api_key, model="gemini-2.0-flash", temperature=0.7)
+    def __init__(self, google_api_key, router=None, plan_cache=None):
+        # Each call type is routed to a configured model tier (see config.MODEL_TIERS)
+        self.router = router or ModelRouter(default_llm_factory(google_api_key))
+        # Optional utils.plan_cache.PlanCache filled by agents/cache_warmer.py
+        self.plan_cache = plan_cache
         
         self.workout_prompt_template = PromptTemplate(
             input_variables=["age", "gender", "weight", "height", "activity_level", "goal", "preferences", "tdee"],
@@ -69,7 +78,7 @@ class FitnessPlanner:
             input_variables=["user_request", "workout_plan", "nutrition_plan", "weekly_schedule"],
             template="""
             You are FitMate, an AI fitness coach. Your primary task is to interpret a user's request for a plan modification and **ABSOLUTELY MUST** output a JSON object describing the change.
-            **CRITICAL: YOUR ENTIRE RESPONSE MUST BE A SINGLE JSON OBJECT INSIDE A MARKDOWN CODE BLOCK (```json...```). DO NOT INCLUDE ANY OTHER TEXT WHATSOEVER (NO GREETINGS, NO EXPLANATIONS, NO APOLOGIES, NO CONVERSATIONAL FILLERS).**
+            **CRITICAL: YOUR ENTIRE RESPONSE MUST BE A SINGLE JSON OBJECT. DO NOT WRAP IT IN A CODE BLOCK AND DO NOT INCLUDE ANY OTHER TEXT WHATSOEVER (NO GREETINGS, NO EXPLANATIONS, NO APOLOGIES, NO CONVERSATIONAL FILLERS).**
             For `suggest_alternative` changes, you **ARE REQUIRED** to use your general knowledge about common food or exercise substitutions to provide a suitable alternative. You are not limited to items explicitly mentioned in the provided plans.
             If you genuinely cannot fulfill a request (e.g., if it's illogical or impossible), you must still output the JSON with `change_type: "cannot_fulfill"` and provide a brief, direct reason in `details`.
 
@@ -80,8 +89,8 @@ class FitnessPlanner:
 
             User's Request: {user_request}
 
-            Output the modification as a JSON object inside a markdown code block. The JSON should have the following structure:
-            '''json
+            Output the modification as a single JSON object. The examples below are fenced for readability only. The JSON should have the following structure:
+            ```json
             {{
               "action": "modify_plan",
               "plan_type": "workout" | "nutrition" | "schedule",
@@ -89,15 +98,15 @@ class FitnessPlanner:
                 {{
                   "target": "day" | "meal" | "exercise" | "general",
                   "value": "[Specific item/day to be changed/removed/replaced, e.g., 'Oatmeal', 'Monday']",
-                  "change_type": "remove" | "add" | "replace" | "adjust_duration" | "adjust_sets_reps" | "suggest_alternative" | "cannot_fulfill",
+                  "change_type": "remove" | "add" | "replace" | "adjust" | "adjust_duration" | "adjust_sets_reps" | "suggest_alternative" | "cannot_fulfill",
                   "details": "[Specific details of the change, e.g., 'reduce to 20 minutes', 'Scrambled eggs with spinach and whole-wheat toast', 'Reason for not fulfilling']"
                 }}
               ]
             }}
-            '''
+            ```
 
             Example 1 (Workout adjustment - reduce duration for Tuesday): 
-            '''json
+            ```json
             {{
               "action": "modify_plan",
               "plan_type": "workout",
@@ -110,10 +119,10 @@ class FitnessPlanner:
                 }}
               ]
             }}
-            '''
+            ```
 
             Example 2 (Nutrition adjustment - suggest alternative for Breakfast):
-            '''json
+            ```json
             {{
               "action": "modify_plan",
               "plan_type": "nutrition",
@@ -126,9 +135,9 @@ class FitnessPlanner:
                 }}
               ]
             }}
-            '''
+            ```
             Example 3 (Weekly Schedule - general adjustment):
-            '''json
+            ```json
             {{
               "action": "modify_plan",
               "plan_type": "schedule",
@@ -141,9 +150,9 @@ class FitnessPlanner:
                 }}
               ]
             }}
-            '''
+            ```
             Example 4 (Cannot fulfill request):
-            '''json
+            ```json
             {{
               "action": "modify_plan",
               "plan_type": "nutrition",
@@ -156,26 +165,35 @@ class FitnessPlanner:
                 }}
               ]
             }}
-            '''
+            ```
             """
         )
 
-        self.workout_chain = LLMChain(llm=self.llm, prompt=self.workout_prompt_template)
-        self.nutrition_chain = LLMChain(llm=self.llm, prompt=self.nutrition_prompt_template)
+    def get_cached_plan(self, age, gender, activity_level, goal, preferences):
+        """Return the pre-generated plan for the user's profile bucket, if one was warmed"""
+        if self.plan_cache is None:
+            return None
+        try:
+            return self.plan_cache.get(profile_bucket(age, gender, activity_level, goal, preferences))
+        except Exception as e:
+            logging.error(f"Error reading plan cache: {e}")
+            return None
 
-    def generate_plan(self, age, gender, weight, height, activity_level, goal, preferences):
+    def generate_plan(self, age, gender, weight, height, activity_level, goal, preferences, tdee=None):
         try:
-            tdee = calculate_tdee(age, gender, weight, height, activity_level)
+            # An estimated TDEE from progress check-ins overrides the formula
+            if tdee is None:
+                tdee = calculate_tdee(age, gender, weight, height, activity_level)
 
-            workout_plan = self.workout_chain.run(
+            workout_plan = self.router.invoke("workout", self.workout_prompt_template.format(
                 age=age, gender=gender, weight=weight, height=height,
                 activity_level=activity_level, goal=goal, preferences=preferences, tdee=round(tdee)
-            )
+            ), fallback=lambda: template_workout_plan(goal, preferences))
             
-            nutrition_plan = self.nutrition_chain.run(
+            nutrition_plan = self.router.invoke("nutrition", self.nutrition_prompt_template.format(
                 age=age, gender=gender, weight=weight, height=height,
                 activity_level=activity_level, goal=goal, preferences=preferences, tdee=round(tdee)
-            )
+            ), fallback=lambda: template_nutrition_plan(goal, preferences, tdee))
 
             return workout_plan, nutrition_plan
         except Exception as e:
@@ -205,11 +223,10 @@ class FitnessPlanner:
                 - Output the weekly schedule in a structured, readable format. Do not use markdown tables.
                 """
             )
-            schedule_chain = LLMChain(llm=self.llm, prompt=schedule_prompt_template)
-            weekly_schedule = schedule_chain.run(
+            weekly_schedule = self.router.invoke("schedule", schedule_prompt_template.format(
                 workout_plan=workout_plan,
                 nutrition_plan=nutrition_plan
-            )
+            ), fallback=lambda: template_weekly_schedule(workout_plan, nutrition_plan))
             return weekly_schedule
         except Exception as e:
             logging.error(f"Error generating weekly schedule: {e}")
@@ -223,15 +240,7 @@ class FitnessPlanner:
 
             if is_modification_request:
                 logging.info(f"User requested plan modification: {user_message}")
-                # Use the dedicated prompt for plan adjustments
-                adjustment_chain = LLMChain(llm=self.llm, prompt=self.plan_adjustment_prompt_template)
-                json_response = adjustment_chain.run(
-                    user_request=user_message,
-                    workout_plan=context.get('workout_plan', 'Not available.'),
-                    nutrition_plan=context.get('nutrition_plan', 'Not available.'),
-                    weekly_schedule=context.get('weekly_schedule', 'Not available.')
-                )
-                return json_response
+                return self.request_modification(user_message, context)
             else:
                 messages = []
                 # Add a system message or initial prompt for the AI to understand its role
@@ -256,11 +265,32 @@ class FitnessPlanner:
                 
                 messages.append(HumanMessage(content=user_message))
 
-                response = self.llm.invoke(messages)
-                return response.content
+                return self.router.invoke("chat", messages)
         except Exception as e:
             logging.error(f"Error in chat response: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again later."
+            return CHAT_ERROR_MESSAGE
+
+    def request_modification(self, user_message, context):
+        """
+        Ask the model for a `modify_plan` JSON object and parse it while streaming.
+        Returns a ModificationRequest, or a message string if the response was unusable.
+        """
+        prompt = self.plan_adjustment_prompt_template.format(
+            user_request=user_message,
+            workout_plan=context.get('workout_plan', 'Not available.'),
+            nutrition_plan=context.get('nutrition_plan', 'Not available.'),
+            weekly_schedule=context.get('weekly_schedule', 'Not available.')
+        )
+        parser = ModificationStreamParser()
+        try:
+            for chunk in self.router.stream("adjustment", prompt):
+                # Stop reading as soon as the object closes
+                if parser.feed(chunk):
+                    break
+            return parser.close()
+        except ModificationParseError as e:
+            logging.error(f"Invalid plan modification response: {e}")
+            return MODIFICATION_ERROR_MESSAGE
 
 class PlannerAgent:
     def __init__(self):
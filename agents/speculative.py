@@ -0,0 +1,174 @@
+"""
+Speculative plan generation while the user edits their profile
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+import threading
+import time
+import logging
+
+from agents.template_plans import is_template_plan
+from config import (
+    SPECULATIVE_DEBOUNCE_SECONDS, SPECULATIVE_MAX_WORKERS, SPECULATIVE_MAX_PER_HOUR,
+    SPECULATIVE_MAX_PER_SESSION, SPECULATIVE_TAKE_TIMEOUT_SECONDS
+)
+
+
+def profile_key(age, gender, weight, height, activity_level, goal, preferences) -> Tuple:
+    return (age, gender, float(weight), height, activity_level, goal, tuple(sorted(preferences)))
+
+
+class SpeculationSlot:
+    """Per-session speculation state: at most one profile is speculated at a time"""
+
+    def __init__(self):
+        self.key = None
+        self.timer: Optional[threading.Timer] = None
+        self.future = None
+        self.started = 0
+        self.lock = threading.Lock()
+
+
+class SpeculativePlanner:
+    """
+    Starts `generate_plan` (and the weekly schedule) in the background once a
+    session's profile has been stable for the debounce window.
+
+    A profile change cancels the pending debounce timer and queued work; a
+    generation that is already running for a stale profile is discarded when it
+    finishes. Spend is capped per session and per hour across all sessions.
+    """
+
+    def __init__(self, planner, debounce=SPECULATIVE_DEBOUNCE_SECONDS, max_workers=SPECULATIVE_MAX_WORKERS,
+                 max_per_hour=SPECULATIVE_MAX_PER_HOUR, max_per_session=SPECULATIVE_MAX_PER_SESSION):
+        self.planner = planner
+        self.debounce = debounce
+        self.max_per_hour = max_per_hour
+        self.max_per_session = max_per_session
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self._recent_starts = deque()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "started": 0, "completed": 0, "failed": 0, "discarded": 0, "cancelled": 0,
+            "budget_skipped": 0, "hits": 0, "in_flight_hits": 0, "misses": 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def observe(self, slot: SpeculationSlot, profile: Dict):
+        """Call on every rerun with the current sidebar profile"""
+        key = profile_key(**profile)
+        with slot.lock:
+            if key == slot.key:
+                return
+            self._cancel_locked(slot)
+            slot.key = key
+            slot.timer = threading.Timer(self.debounce, self._start, args=(slot, key, profile))
+            slot.timer.daemon = True
+            slot.timer.start()
+
+    def cancel(self, slot: SpeculationSlot):
+        with slot.lock:
+            self._cancel_locked(slot)
+            slot.key = None
+
+    def _cancel_locked(self, slot):
+        if slot.timer is not None:
+            slot.timer.cancel()
+            slot.timer = None
+        if slot.future is not None and slot.future.cancel():
+            self._count("cancelled")
+        # A running generation can't be interrupted; _run discards its result
+        slot.future = None
+
+    def _prune_recent_starts_locked(self):
+        now = time.monotonic()
+        while self._recent_starts and now - self._recent_starts[0] > 3600:
+            self._recent_starts.popleft()
+        return now
+
+    def _reserve_budget(self, slot) -> bool:
+        with self._lock:
+            now = self._prune_recent_starts_locked()
+            if len(self._recent_starts) >= self.max_per_hour or slot.started >= self.max_per_session:
+                self._metrics["budget_skipped"] += 1
+                return False
+            self._recent_starts.append(now)
+            self._metrics["started"] += 1
+        slot.started += 1
+        return True
+
+    def _start(self, slot, key, profile):
+        with slot.lock:
+            # A timer that already fired may still get here after take() or a
+            # profile change replaced or cleared it; only the current timer starts work
+            if slot.key != key or slot.timer is not threading.current_thread():
+                return
+            slot.timer = None
+            if not self._reserve_budget(slot):
+                return
+            slot.future = self._executor.submit(self._run, slot, key, profile)
+
+    def _run(self, slot, key, profile):
+        workout_plan, nutrition_plan = self.planner.generate_plan(**profile)
+        if "Error" in workout_plan or "Error" in nutrition_plan:
+            self._count("failed")
+            return None
+        weekly_schedule = self.planner.generate_weekly_schedule(workout_plan, nutrition_plan)
+        if "Error" in weekly_schedule:
+            self._count("failed")
+            return None
+        if is_template_plan(workout_plan, nutrition_plan, weekly_schedule):
+            # The router fell back to local templates; let Generate retry the models
+            logging.info("Discarding speculative plan built from local templates.")
+            self._count("failed")
+            return None
+        if slot.key != key:
+            logging.info("Discarding speculative plan for a stale profile.")
+            self._count("discarded")
+            return None
+        self._count("completed")
+        return workout_plan, nutrition_plan, weekly_schedule
+
+    def take(self, slot: SpeculationSlot, profile: Dict, timeout=SPECULATIVE_TAKE_TIMEOUT_SECONDS):
+        """
+        Claim the speculated (workout_plan, nutrition_plan, weekly_schedule) for
+        `profile`, waiting for an in-flight generation if needed. Returns None on a miss.
+        """
+        key = profile_key(**profile)
+        with slot.lock:
+            future = slot.future if slot.key == key else None
+            if future is None:
+                self._cancel_locked(slot)
+            slot.future = None
+            # Keep the key so later reruns don't speculate the profile just generated
+            slot.key = key
+        if future is None:
+            self._count("misses")
+            return None
+        in_flight = not future.done()
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            result = None
+        except Exception as e:
+            logging.error(f"Speculative plan generation failed: {e}")
+            result = None
+        if result is None:
+            self._count("misses")
+        else:
+            self._count("in_flight_hits" if in_flight else "hits")
+        return result
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            self._prune_recent_starts_locked()
+            metrics["spent_last_hour"] = len(self._recent_starts)
+        served = metrics["hits"] + metrics["in_flight_hits"]
+        requests = served + metrics["misses"]
+        metrics["hit_rate"] = round(served / requests, 3) if requests else 0.0
+        return metrics
@@ -0,0 +1,122 @@
+"""
+Local template-based plans used when no model tier is available
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+import json
+import re
+
+from config import (
+    WORKOUT_TEMPLATES_PATH, NUTRITION_TEMPLATES_PATH,
+    DEFAULT_EXPERIENCE_LEVEL, DEFAULT_WORKOUT_DAYS
+)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+WEEK_DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# First line of every template plan, so callers can tell it apart from a generated one
+TEMPLATE_PLAN_NOTICE = (
+    "_Our AI planner is unavailable right now, so this is a generic template plan "
+    "rather than one personalized for you. Try generating again later._"
+)
+
+# Ingredients that rule a template meal out for vegan users
+NON_VEGAN_INGREDIENTS = ("yogurt", "cheese", "feta", "honey", "egg", "whey")
+
+_DAY_HEADING = re.compile(
+    r"^[\s*#-]*(" + "|".join(WEEK_DAYS) + r")\b[\s*:\-–]*(.*)$", re.IGNORECASE | re.MULTILINE
+)
+_MEAL_HEADING = re.compile(
+    r"^[\s*#-]*(breakfast|lunch|dinner|snacks?)\b[\s*:\-–]*(.*)$", re.IGNORECASE | re.MULTILINE
+)
+
+
+def is_template_plan(*plans: str) -> bool:
+    """True if any of the plans was produced by this module instead of a model"""
+    return any(plan and plan.startswith(TEMPLATE_PLAN_NOTICE) for plan in plans)
+
+
+@lru_cache(maxsize=None)
+def _load_templates(path) -> Dict:
+    with open(ROOT_DIR / path) as f:
+        return json.load(f)
+
+
+def template_workout_plan(goal: str, preferences: List[str]) -> str:
+    """Format the beginner workout templates as a 3-day plan"""
+    workouts = _load_templates(WORKOUT_TEMPLATES_PATH)[DEFAULT_EXPERIENCE_LEVEL]
+    lines = [TEMPLATE_PLAN_NOTICE, "", f"**3-Day Workout Plan ({goal})**", ""]
+    for day, (workout_type, exercises) in zip(DEFAULT_WORKOUT_DAYS, workouts.items()):
+        lines.append(f"**{day.title()}: {workout_type.replace('_', ' ').title()}**")
+        lines.append("Warm-up: 5-10 minutes of light cardio and dynamic stretching")
+        for exercise in exercises:
+            lines.append(
+                f"- {exercise['exercise']}: {exercise['sets']} sets of {exercise['reps']}, "
+                f"rest {exercise['rest']} ({exercise['notes']})"
+            )
+        lines.append("Cool-down: 5-10 minutes of static stretching")
+        lines.append("")
+    if "No Gym Access" in preferences or "Home Workouts Only" in preferences:
+        lines.append("Use water bottles or resistance bands in place of dumbbells.")
+    return "\n".join(lines).strip()
+
+
+def _suits(meal, preferences) -> bool:
+    if "Vegan" not in preferences:
+        return True
+    ingredients = " ".join(meal["ingredients"]).lower()
+    return not any(item in ingredients for item in NON_VEGAN_INGREDIENTS)
+
+
+def template_nutrition_plan(goal: str, preferences: List[str], tdee) -> str:
+    """Format one suitable meal of each nutrition template type as a daily plan"""
+    meals = _load_templates(NUTRITION_TEMPLATES_PATH)["vegetarian"]
+    chosen = []
+    for meal_type, options in meals.items():
+        suitable = [meal for meal in options if _suits(meal, preferences)]
+        if suitable:
+            chosen.append((meal_type, suitable[0]))
+    total = sum(meal["macros"]["calories"] for _, meal in chosen)
+
+    lines = [TEMPLATE_PLAN_NOTICE, "", f"**Daily Nutrition Plan ({goal})**", ""]
+    for meal_type, meal in chosen:
+        macros = meal["macros"]
+        lines.append(f"**{meal_type.title()}: {meal['name']}**")
+        lines.append(f"Ingredients: {', '.join(meal['ingredients'])}")
+        lines.append(
+            f"Calories: {macros['calories']} | Protein: {macros['protein']}g | "
+            f"Carbs: {macros['carbs']}g | Fat: {macros['fat']}g"
+        )
+        lines.append("")
+    lines.append(
+        f"These meals add up to about {total} calories. Your estimated maintenance needs (TDEE) are "
+        f"about {round(tdee)} calories before any adjustment for your goal, so scale portions to suit."
+    )
+    return "\n".join(lines).strip()
+
+
+def template_weekly_schedule(workout_plan: str, nutrition_plan: str) -> str:
+    """Lay out the week from the day headings of the workout plan and the meals of the nutrition plan"""
+    workout_days = {}
+    for day, title in _DAY_HEADING.findall(workout_plan or ""):
+        title = title.strip(" *:-–")
+        workout_days.setdefault(day.lower(), f"{title} workout" if title else "Workout from your plan")
+    if not workout_days:
+        workout_days = {day: "Workout from your workout plan" for day in DEFAULT_WORKOUT_DAYS}
+
+    meals = {}
+    for meal_type, name in _MEAL_HEADING.findall(nutrition_plan or ""):
+        # Drop trailing calorie/macro details, e.g. "Oatmeal (400 calories)"
+        name = re.sub(r"\s*\(.*$", "", name).strip(" *:-–")
+        if name:
+            meals.setdefault(meal_type.lower().rstrip("s"), name)
+    meal_summary = "; ".join(f"{meal_type.title()}: {name}" for meal_type, name in meals.items())
+    if not meal_summary:
+        meal_summary = "Breakfast, Lunch, Dinner and Snacks from the nutrition plan"
+
+    lines = [TEMPLATE_PLAN_NOTICE, ""]
+    for day in WEEK_DAYS:
+        activity = workout_days.get(day, "Rest day - light walking or stretching")
+        lines.append(f"**{day.title()}**: {activity}. Meals: {meal_summary}.")
+    return "\n".join(lines)
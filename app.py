@@ -2,9 +2,16 @@ import streamlit as st
 from dotenv import load_dotenv
 import os
 from agents.planner import FitnessPlanner
+from agents.modifications import ModificationRequest, apply_plan_modifications
+from agents.speculative import SpeculativePlanner, SpeculationSlot
+from agents.template_plans import is_template_plan
 from utils.pdf_generator import create_fitness_plan_pdf
-import json
-import re
+from utils.plan_cache import PlanCache, profile_bucket
+from utils.progress import ProgressLog
+from utils.session_memory import ChatHistory, session_memory_report
+from utils.tdee import calculate_tdee
+from config import CHAT_CONTEXT_TURNS, CHAT_PAGE_SIZE, PDF_CACHE_MAX_ENTRIES
+from datetime import date
 import logging
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,65 +19,28 @@ logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-planner = FitnessPlanner(google_api_key=GOOGLE_API_KEY)
+@st.cache_resource
+def get_planner(google_api_key):
+    # Shared across reruns and sessions so router latency stats persist
+    return FitnessPlanner(google_api_key=google_api_key, plan_cache=PlanCache())
 
-def apply_plan_modifications(plan_type, modifications, current_workout_plan, current_nutrition_plan, current_weekly_schedule):
-    updated_workout_plan = current_workout_plan
-    updated_nutrition_plan = current_nutrition_plan
-    updated_weekly_schedule = current_weekly_schedule
-    feedback_message = []
+planner = get_planner(GOOGLE_API_KEY)
 
-    for mod in modifications:
-        target = mod.get("target", "")
-        value = mod.get("value", "")
-        change_type = mod.get("change_type", "")
-        details = mod.get("details", "")
+@st.cache_resource
+def get_speculative_planner(google_api_key):
+    # One worker pool and spend budget for all sessions
+    return SpeculativePlanner(get_planner(google_api_key))
 
-        if plan_type == "workout":
-            if change_type == "adjust_duration":
+speculative_planner = get_speculative_planner(GOOGLE_API_KEY)
 
-                if value in updated_workout_plan:
-                    updated_workout_plan = updated_workout_plan.replace(
-                        value, f"{value} ({details})"
-                    )
-                    feedback_message.append(f"Workout plan for {value} adjusted: {details}.")
-                else:
-                    feedback_message.append(f"Could not find '{value}' in workout plan to adjust.")
-            elif change_type == "suggest_alternative":
-                if value in updated_workout_plan:
-                    updated_workout_plan = updated_workout_plan.replace(
-                        value, details
-                    )
-                    feedback_message.append(f"Workout plan alternative for {value} suggested: {details}.")
-                else:
-                    feedback_message.append(f"Could not find '{value}' in workout plan to suggest alternative.")
-
-        elif plan_type == "nutrition":
-            if change_type == "suggest_alternative" or change_type == "remove" or change_type == "replace":
-
-                if value in updated_nutrition_plan:
-
-                    lines = updated_nutrition_plan.split('\n')
-                    for i, line in enumerate(lines):
-                        if value in line:
-                            if change_type == "remove":
-                                lines[i] = "" 
-                                feedback_message.append(f"Nutrition meal '{value}' removed.")
-                            elif change_type == "suggest_alternative" or change_type == "replace":
-                                lines[i] = f"{details}" 
-                                feedback_message.append(f"Nutrition meal '{value}' replaced with '{details}'.")
-                            break
-                    updated_nutrition_plan = '\n'.join([line for line in lines if line]) 
-                else:
-                    feedback_message.append(f"Could not find '{value}' in nutrition plan to suggest alternative/remove.")
-
-        elif plan_type == "schedule":
-            if change_type == "adjust":
-
-                updated_weekly_schedule += f"\n\nNote: {details}"
-                feedback_message.append(f"Weekly schedule adjusted: {details}.")
-
-    return updated_workout_plan, updated_nutrition_plan, updated_weekly_schedule, "; ".join(feedback_message)
+@st.cache_data(max_entries=PDF_CACHE_MAX_ENTRIES, show_spinner=False)
+def get_plan_pdf(workout_plan, nutrition_plan, weekly_schedule, plan_bucket=None):
+    # Shared and bounded across sessions, so PDF bytes are neither rebuilt on
+    # every rerun nor held in each session's state
+    cached_plan = planner.plan_cache.get(plan_bucket) if plan_bucket and planner.plan_cache else None
+    if cached_plan and cached_plan.pdf:
+        return cached_plan.pdf
+    return create_fitness_plan_pdf(workout_plan, nutrition_plan, weekly_schedule)
 
 st.set_page_config(
     page_title="FitMate AI Coach",
@@ -84,8 +54,12 @@ Your personal AI-powered fitness coach that creates customized workout and nutri
 based on your goals and preferences.
 """)
 
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = ChatHistory()
+    st.session_state.chat_page = 0  # 0 is the newest page
+chat_history = st.session_state.chat_history
+if "speculation_slot" not in st.session_state:
+    st.session_state.speculation_slot = SpeculationSlot()
 
 with st.sidebar:
     st.header("Your Profile")
@@ -111,34 +85,109 @@ with st.sidebar:
         ["Vegetarian", "Vegan", "No Gym Access", "Home Workouts Only", "Time Constrained"]
     )
     
+    speculative_mode = st.checkbox(
+        "Start generating while I edit",
+        help="Begins generating your plan in the background once your profile stops changing."
+    )
+
     generate_plan = st.button("Generate My Plan", type="primary")
 
+    if speculative_mode:
+        with st.expander("Speculation Metrics"):
+            st.json(speculative_planner.metrics())
+
+    with st.expander("Session Memory"):
+        st.json(session_memory_report(chat_history, {
+            "workout_plan": st.session_state.get("workout_plan"),
+            "nutrition_plan": st.session_state.get("nutrition_plan"),
+            "weekly_schedule": st.session_state.get("weekly_schedule"),
+        }))
+
+profile = dict(
+    age=age, gender=gender, weight=weight, height=height,
+    activity_level=activity_level, goal=goal, preferences=preferences
+)
+# Warmed buckets are served from the plan cache, so there is nothing to speculate
+# (an existence check; the cached plan itself is only loaded on Generate)
+is_warmed = planner.plan_cache is not None and profile_bucket(age, gender, activity_level, goal, preferences) in planner.plan_cache
+if speculative_mode and GOOGLE_API_KEY and not is_warmed:
+    speculative_planner.observe(st.session_state.speculation_slot, profile)
+else:
+    speculative_planner.cancel(st.session_state.speculation_slot)
+
+def record_plan_baseline(planned_tdee):
+    # Progress drift (and replanning) is measured against the plan the user is following now
+    user_id = st.session_state.get("user_id")
+    if user_id:
+        progress_log = ProgressLog(user_id)
+        if progress_log.stats.count:
+            progress_log.set_plan(planned_tdee, day=date.today().toordinal())
+
+cached_plan = None
 if generate_plan:
+    # Popular profile buckets are pre-generated by agents/cache_warmer.py
+    cached_plan = planner.get_cached_plan(age, gender, activity_level, goal, preferences)
+
+if cached_plan:
+    st.session_state.workout_plan = cached_plan.workout_plan
+    st.session_state.nutrition_plan = cached_plan.nutrition_plan
+    st.session_state.weekly_schedule = cached_plan.weekly_schedule
+    st.session_state.plan_bucket = cached_plan.bucket
+    # Cached plans were generated for a representative of the bucket, so their
+    # calorie figures come from someone else's weight and height
+    user_tdee = calculate_tdee(age, gender, weight, height, activity_level)
+    st.session_state.plan_note = (
+        "This plan was pre-generated for people with a similar profile (age range, gender, activity level, "
+        "goal and preferences), so its calorie figures may not match you exactly. Based on your weight and "
+        f"height, your estimated daily calorie needs (TDEE) are about {round(user_tdee)} calories; "
+        "scale portions accordingly."
+    )
+    record_plan_baseline(user_tdee)
+    st.success("Plan Generated!")
+elif generate_plan:
+    st.session_state.plan_bucket = None
+    st.session_state.plan_note = None
     if not GOOGLE_API_KEY:
         st.error("GOOGLE_API_KEY not found. Please set it in your .env file.")
     else:
         with st.spinner("Generating your personalized plan..."):
-            workout_plan, nutrition_plan = planner.generate_plan(
-                age, gender, weight, height, activity_level, goal, preferences
-            )
-            if "Error" in workout_plan or "Error" in nutrition_plan:
-                st.error("An error occurred while generating your plans. Please check the logs for details.")
-                st.session_state.workout_plan = None
-                st.session_state.nutrition_plan = None
-                st.session_state.weekly_schedule = None
+            # A speculative generation for this exact profile may already be done or in flight
+            speculated_plan = speculative_planner.take(st.session_state.speculation_slot, profile) if speculative_mode else None
+            if speculated_plan:
+                (st.session_state.workout_plan, st.session_state.nutrition_plan,
+                 st.session_state.weekly_schedule) = speculated_plan
             else:
-                st.session_state.workout_plan = workout_plan
-                st.session_state.nutrition_plan = nutrition_plan
-                weekly_schedule = planner.generate_weekly_schedule(workout_plan, nutrition_plan)
-                if "Error" in weekly_schedule:
-                    st.error("An error occurred while generating your weekly schedule. Please check the logs for details.")
+                workout_plan, nutrition_plan = planner.generate_plan(
+                    age, gender, weight, height, activity_level, goal, preferences
+                )
+                if "Error" in workout_plan or "Error" in nutrition_plan:
+                    st.error("An error occurred while generating your plans. Please check the logs for details.")
+                    st.session_state.workout_plan = None
+                    st.session_state.nutrition_plan = None
                     st.session_state.weekly_schedule = None
                 else:
-                    st.session_state.weekly_schedule = weekly_schedule
-        st.success("Plan Generated!")
+                    st.session_state.workout_plan = workout_plan
+                    st.session_state.nutrition_plan = nutrition_plan
+                    weekly_schedule = planner.generate_weekly_schedule(workout_plan, nutrition_plan)
+                    if "Error" in weekly_schedule:
+                        st.error("An error occurred while generating your weekly schedule. Please check the logs for details.")
+                        st.session_state.weekly_schedule = None
+                    else:
+                        st.session_state.weekly_schedule = weekly_schedule
+        plans = (st.session_state.workout_plan, st.session_state.nutrition_plan, st.session_state.weekly_schedule)
+        if is_template_plan(*plans):
+            st.warning(
+                "Our AI planner is unavailable right now, so you're seeing a generic template plan. "
+                "Try generating again in a few minutes for a personalized one."
+            )
+        elif all(plans):
+            record_plan_baseline(calculate_tdee(age, gender, weight, height, activity_level))
+            st.success("Plan Generated!")
 
 if "workout_plan" in st.session_state and st.session_state.workout_plan:
     st.header("Your Personalized Plan")
+    if st.session_state.get("plan_note"):
+        st.info(st.session_state.plan_note)
     
     tab1, tab2, tab3 = st.tabs(["Workout Plan", "Nutrition Plan", "Weekly Schedule"])
     
@@ -155,10 +204,11 @@ if "workout_plan" in st.session_state and st.session_state.workout_plan:
         st.markdown(st.session_state.weekly_schedule)
 
     # PDF Download Button (remains outside tabs but within the plan display block)
-    pdf_buffer = create_fitness_plan_pdf(
+    pdf_buffer = get_plan_pdf(
         st.session_state.workout_plan,
         st.session_state.nutrition_plan,
-        st.session_state.weekly_schedule
+        st.session_state.weekly_schedule,
+        st.session_state.get("plan_bucket")
     )
     st.download_button(
         label="Download Plan as PDF",
@@ -172,10 +222,67 @@ else:
 
 st.divider()
 
+st.header("Daily Check-in")
+
+with st.form("check_in"):
+    user_id = st.text_input("Your name (used to keep your progress)", value=st.session_state.get("user_id", ""))
+    checkin_weight = st.number_input("Today's weight (kg)", min_value=30.0, max_value=200.0, value=weight)
+    checkin_calories = st.number_input("Calories eaten today", min_value=0, max_value=10000, value=2000, step=50)
+    checkin_workouts = st.number_input("Workouts completed today", min_value=0, max_value=5, value=0)
+    submitted_check_in = st.form_submit_button("Save Check-in")
+
+if submitted_check_in:
+    if not user_id.strip():
+        st.error("Please enter your name to save your check-in.")
+    else:
+        st.session_state.user_id = user_id
+        progress_log = ProgressLog(user_id)
+        today = date.today().toordinal()
+        if progress_log.stats.planned_tdee is None:
+            # First check-in: the formula TDEE at today's weight is the baseline
+            progress_log.set_plan(calculate_tdee(age, gender, checkin_weight, height, activity_level), day=today)
+        stats = progress_log.check_in(today, checkin_weight, checkin_calories, checkin_workouts)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Trend Weight", f"{stats.trend_weight:.1f} kg", f"{stats.weight_slope * 7:+.2f} kg/week")
+        col2.metric("Workout Adherence", f"{stats.adherence:.0%}")
+        col3.metric("Estimated TDEE", f"{stats.estimated_tdee:.0f} kcal", f"{stats.tdee_drift:+.0%} vs plan")
+
+        with st.spinner("Checking whether your plan needs adjusting..."):
+            new_plans = progress_log.maybe_replan(
+                planner, today, age, gender, height, activity_level, goal, preferences
+            )
+        if new_plans:
+            st.session_state.workout_plan, st.session_state.nutrition_plan = new_plans
+            weekly_schedule = planner.generate_weekly_schedule(*new_plans)
+            st.session_state.weekly_schedule = None if "Error" in weekly_schedule else weekly_schedule
+            st.session_state.plan_bucket = None
+            st.session_state.plan_note = None
+            st.info("Your progress differs from what your plan expected, so your plan has been updated.")
+        st.success("Check-in saved!")
+
+st.divider()
+
 st.header("Chat with FitMate")
 
-# Display chat messages from history on app rerun
-for message in st.session_state.messages:
+def change_chat_page(step):
+    st.session_state.chat_page += step
+
+# Display one page of chat history on app rerun; older pages are read from disk on demand
+page_count = chat_history.page_count(CHAT_PAGE_SIZE)
+st.session_state.chat_page = min(st.session_state.chat_page, page_count - 1)
+if page_count > 1:
+    col_older, col_position, col_newer = st.columns([1, 2, 1])
+    col_older.button(
+        "Older messages", on_click=change_chat_page, args=(1,),
+        disabled=st.session_state.chat_page >= page_count - 1
+    )
+    col_position.caption(f"Page {page_count - st.session_state.chat_page} of {page_count}")
+    col_newer.button(
+        "Newer messages", on_click=change_chat_page, args=(-1,),
+        disabled=st.session_state.chat_page == 0
+    )
+for message in chat_history.page(st.session_state.chat_page, CHAT_PAGE_SIZE):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -184,8 +291,9 @@ if prompt := st.chat_input("Ask FitMate a question..."):
     # Display user message in chat message container
     with st.chat_message("user"):
         st.markdown(prompt)
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    # Add user message to chat history and jump back to the newest page
+    chat_history.append({"role": "user", "content": prompt})
+    st.session_state.chat_page = 0
 
     with st.spinner("FitMate is thinking..."):
         # Prepare context for the chat agent
@@ -195,100 +303,47 @@ if prompt := st.chat_input("Ask FitMate a question..."):
             "weekly_schedule": st.session_state.get("weekly_schedule", "Not yet generated."),
         }
 
-        response = planner.chat_response(prompt, st.session_state.messages, context)
-
-    # Attempt to parse response as direct JSON first (if AI doesn't wrap in markdown)
-    modification_applied = False
-    try:
-        modification_data = json.loads(response) # Try parsing the whole response as JSON
-        logging.info("Attempting to parse response as direct JSON.")
-
-        action = modification_data.get("action")
-        plan_type = modification_data.get("plan_type")
-        modifications = modification_data.get("modifications", [])
-
-        if action == "modify_plan" and plan_type and modifications:
-            logging.info(f"Direct JSON modification request detected for {plan_type} plan.")
+        response = planner.chat_response(prompt, chat_history.last(CHAT_CONTEXT_TURNS), context)
+
+    # Plan edits come back already parsed and validated by the planner
+    if isinstance(response, ModificationRequest):
+        plan_updated = False
+        try:
+            logging.info(f"Modification request detected for {response.plan_type} plan.")
+            current_plans = (
+                st.session_state.get("workout_plan", ""),
+                st.session_state.get("nutrition_plan", ""),
+                st.session_state.get("weekly_schedule", "")
+            )
             (updated_workout, updated_nutrition, updated_schedule, feedback_msg) = \
-                apply_plan_modifications(
-                    plan_type, modifications,
-                    st.session_state.get("workout_plan", ""),
-                    st.session_state.get("nutrition_plan", ""),
-                    st.session_state.get("weekly_schedule", "")
-                )
-            
-            st.session_state.workout_plan = updated_workout
-            st.session_state.nutrition_plan = updated_nutrition
-            st.session_state.weekly_schedule = updated_schedule
+                apply_plan_modifications(response, *current_plans)
+
+            if (updated_workout, updated_nutrition, updated_schedule) != current_plans:
+                st.session_state.workout_plan = updated_workout
+                st.session_state.nutrition_plan = updated_nutrition
+                st.session_state.weekly_schedule = updated_schedule
+                st.session_state.plan_bucket = None
 
-            with st.chat_message("assistant"):
-                st.success(f"Plan Updated! {feedback_msg}")
-            st.session_state.messages.append({"role": "assistant", "content": f"Plan Updated! {feedback_msg}"})
-            st.experimental_rerun() # Rerun to update the displayed plans immediately
-            modification_applied = True
-        else:
-            logging.info("Direct JSON parsed but not a recognized modification action.")
-            pass # If it's JSON but not a recognized modification, just treat as regular chat for now.
-    except json.JSONDecodeError:
-        logging.info("Response is not direct JSON. Checking for markdown JSON block.")
-        pass # Not direct JSON, proceed to check for markdown JSON block
-    except Exception as e:
-        logging.error(f"Error processing direct JSON response: {e}")
-        with st.chat_message("assistant"):
-            st.markdown("An error occurred while processing a potential plan adjustment. Please check logs for details.")
-        st.session_state.messages.append({"role": "assistant", "content": "An error occurred while processing a potential plan adjustment. Please check logs for details."})
-        modification_applied = True # Prevent further processing if an error occurred during direct JSON handling
-
-    if not modification_applied: # Only proceed if no modification was applied by direct JSON parsing
-        # Check if the response contains a JSON modification request wrapped in markdown
-        json_match = re.search(r"```json\s*(.*?)\s*```", response, re.DOTALL) # Corrected regex
-        if json_match:
-            try:
-                json_content = json_match.group(1)
-                logging.info(f"Markdown JSON block detected. Content: {json_content[:200]}...") # Log snippet
-                modification_data = json.loads(json_content)
-                action = modification_data.get("action")
-                plan_type = modification_data.get("plan_type")
-                modifications = modification_data.get("modifications", [])
-
-                if action == "modify_plan" and plan_type and modifications:
-                    logging.info(f"Markdown JSON modification request detected for {plan_type} plan.")
-                    (updated_workout, updated_nutrition, updated_schedule, feedback_msg) = \
-                        apply_plan_modifications(
-                            plan_type, modifications,
-                            st.session_state.get("workout_plan", ""),
-                            st.session_state.get("nutrition_plan", ""),
-                            st.session_state.get("weekly_schedule", "")
-                        )
-                    
-                    st.session_state.workout_plan = updated_workout
-                    st.session_state.nutrition_plan = updated_nutrition
-                    st.session_state.weekly_schedule = updated_schedule
-
-                    with st.chat_message("assistant"):
-                        st.success(f"Plan Updated! {feedback_msg}")
-                    st.session_state.messages.append({"role": "assistant", "content": f"Plan Updated! {feedback_msg}"})
-                    
-                    st.experimental_rerun() # Rerun to update the displayed plans immediately
-                else:
-                    logging.info("Markdown JSON parsed but not a recognized modification action.")
-                    with st.chat_message("assistant"):
-                        st.markdown("I understood your request for a plan modification, but the structure was not recognized. Please try rephrasing.")
-                    st.session_state.messages.append({"role": "assistant", "content": "I understood your request for a plan modification, but the structure was not recognized. Please try rephrasing."})
-            except json.JSONDecodeError as e:
-                logging.error(f"Failed to parse JSON from AI response wrapped in markdown: {e}")
                 with st.chat_message("assistant"):
-                    st.markdown("I received a malformed response (JSON in markdown) when trying to adjust your plan. Please try again or rephrase your request.")
-                st.session_state.messages.append({"role": "assistant", "content": "I received a malformed response (JSON in markdown) when trying to adjust your plan. Please try again or rephrase your request."})
-            except Exception as e:
-                logging.error(f"Error applying plan modifications from markdown JSON: {e}")
+                    st.success(f"Plan Updated! {feedback_msg}")
+                chat_history.append({"role": "assistant", "content": f"Plan Updated! {feedback_msg}"})
+                plan_updated = True
+            else:
+                # Nothing applied (e.g. cannot_fulfill, or the target wasn't found)
+                feedback_msg = feedback_msg or "I couldn't find anything in your plan to change for that request."
                 with st.chat_message("assistant"):
-                    st.markdown("An unexpected error occurred while trying to apply plan adjustments from markdown JSON. Please check the logs for details.")
-                st.session_state.messages.append({"role": "assistant", "content": "An unexpected error occurred while trying to apply plan adjustments from markdown JSON. Please check the logs for details."})
-        else:
-            logging.info("Response is not a recognized JSON modification; treating as regular chat.")
-            # Display assistant response in chat message container for regular chat
+                    st.markdown(feedback_msg)
+                chat_history.append({"role": "assistant", "content": feedback_msg})
+        except Exception as e:
+            logging.error(f"Error applying plan modifications: {e}")
             with st.chat_message("assistant"):
-                st.markdown(response)
-            # Add assistant response to chat history
-            st.session_state.messages.append({"role": "assistant", "content": response}) 
\ No newline at end of file
+                st.markdown("An unexpected error occurred while trying to apply plan adjustments. Please check the logs for details.")
+            chat_history.append({"role": "assistant", "content": "An unexpected error occurred while trying to apply plan adjustments. Please check the logs for details."})
+        if plan_updated:
+            st.rerun() # Rerun to update the displayed plans immediately
+    else:
+        # Display assistant response in chat message container for regular chat
+        with st.chat_message("assistant"):
+            st.markdown(response)
+        # Add assistant response to chat history
+        chat_history.append({"role": "assistant", "content": response})
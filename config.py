@@ -38,3 +38,67 @@ ACTIVITY_MULTIPLIERS = {
     "very active": 1.725,
     "extra active": 1.9
 } 
+
+# Model Routing
+MODEL_TIERS = {
+    "quality": {"model": "gemini-2.0-flash", "temperature": 0.7, "timeout": 60, "max_retries": 1},
+    "fast": {"model": "gemini-2.0-flash-lite", "temperature": 0.7, "timeout": 30, "max_retries": 1},
+}
+CALL_TYPE_TIERS = {
+    "workout": "quality",
+    "nutrition": "quality",
+    "schedule": "quality",
+    "adjustment": "fast",
+    "chat": "fast",
+}
+# Tier to fall back to when a tier is degraded or fails
+FALLBACK_TIERS = {
+    "quality": "fast",
+}
+# Call types that must return JSON (run at temperature 0)
+JSON_CALL_TYPES = ["adjustment"]
+# Latency SLO per call type in seconds
+LATENCY_SLO_SECONDS = {
+    "workout": 20,
+    "nutrition": 20,
+    "schedule": 25,
+    "adjustment": 8,
+    "chat": 8,
+}
+ROUTER_WINDOW_SIZE = 50
+ROUTER_MIN_SAMPLES = 5  # Calls needed in the window before the error rate can degrade a tier
+# Latencies needed before p95 can degrade a tier; with fewer, p95 is just the slowest call
+ROUTER_MIN_LATENCY_SAMPLES = 20
+ROUTER_MAX_ERROR_RATE = 0.5
+ROUTER_COOLDOWN_SECONDS = 60
+
+# Plan Cache
+PLAN_CACHE_PATH = f"{DATA_DIR}/cache/plans.sqlite3"
+PROFILE_DISTRIBUTION_PATH = f"{DATA_DIR}/profiles/distribution.json"
+AGE_BANDS = [(16, 24), (25, 34), (35, 44), (45, 54), (55, 64), (65, 100)]
+CACHE_WARMER_MAX_WORKERS = 4
+CACHE_WARMER_MAX_BUCKETS = 25
+
+# Progress Tracking
+PROGRESS_DIR = f"{DATA_DIR}/progress"
+TREND_SMOOTHING = 0.1  # Exponential smoothing factor for trend weight and intake
+KCAL_PER_KG = 7700  # Approximate energy content of 1 kg of body weight
+REPLAN_DRIFT_THRESHOLD = 0.1  # Replan when estimated TDEE differs from plan by more than 10%
+REPLAN_MIN_CHECK_INS = 14
+REPLAN_COOLDOWN_DAYS = 14
+
+# Session Memory
+CHAT_MEMORY_TURNS = 40  # Chat messages kept in memory per session
+CHAT_CONTEXT_TURNS = 10  # Recent messages sent to the model as chat history
+CHAT_PAGE_SIZE = 20  # Messages rendered per page of chat history
+CHAT_SPILL_DIR = "fitmate_chat"  # Under the system temp directory
+CHAT_SPILL_MAX_AGE_SECONDS = 24 * 60 * 60
+CHAT_SPILL_PRUNE_INTERVAL_SECONDS = 10 * 60
+PDF_CACHE_MAX_ENTRIES = 100
+
+# Speculative Generation
+SPECULATIVE_DEBOUNCE_SECONDS = 2.0  # Profile must be unchanged this long before speculating
+SPECULATIVE_MAX_WORKERS = 4
+SPECULATIVE_MAX_PER_HOUR = 200  # Speculative generations across all sessions
+SPECULATIVE_MAX_PER_SESSION = 5
+SPECULATIVE_TAKE_TIMEOUT_SECONDS = 120
@@ -0,0 +1,102 @@
+import pytest
+
+from agents.modifications import (
+    ModificationParseError, ModificationStreamParser, PlanModification, parse_modification_response
+)
+
+VALID = (
+    '{"action": "modify_plan", "plan_type": "nutrition", "modifications": ['
+    '{"target": "meal", "value": "Oatmeal", "change_type": "replace", "details": "Tofu scramble"}]}'
+)
+EXPECTED = [PlanModification(target="meal", value="Oatmeal", change_type="replace", details="Tofu scramble")]
+
+
+@pytest.mark.parametrize("text", [
+    VALID,
+    f"```json\n{VALID}\n```",
+    f"Sure! Here is the change:\n```json\n{VALID}\n```\nLet me know if you need more.",
+    f"'''json\n{VALID}\n'''",
+    f"Plans use {{day}} placeholders. {VALID}",
+    f"Here {{it's}} done {VALID}",
+    f"Inline code like `{{x}}` first, then ```json\n{VALID}\n```",
+])
+def test_finds_object_around_prose_and_fences(text):
+    result = parse_modification_response(text)
+    assert result.plan_type == "nutrition"
+    assert result.modifications == EXPECTED
+
+
+def test_single_quotes():
+    text = VALID.replace('"', "'")
+    assert parse_modification_response(text).modifications == EXPECTED
+
+
+def test_escaped_single_quote_inside_single_quoted_string():
+    text = VALID.replace('"', "'").replace("Tofu scramble", "Tofu scramble (chef\\'s choice)")
+    assert parse_modification_response(text).modifications[0].details == "Tofu scramble (chef's choice)"
+
+
+def test_curly_quotes():
+    parts = VALID.split('"')
+    # Opening and closing quotes alternate, so odd parts are the quoted strings
+    text = "".join(f"“{part}”" if i % 2 else part for i, part in enumerate(parts))
+    assert parse_modification_response(text).modifications == EXPECTED
+
+
+def test_double_quote_inside_single_quoted_string():
+    text = VALID.replace('"', "'").replace("Tofu scramble", 'Tofu "scramble"')
+    assert parse_modification_response(text).modifications[0].details == 'Tofu "scramble"'
+
+
+def test_raw_newlines_and_tabs_in_strings():
+    text = VALID.replace("Tofu scramble", "Tofu\nscramble\twith spinach")
+    assert parse_modification_response(text).modifications[0].details == "Tofu\nscramble\twith spinach"
+
+
+def test_trailing_commas():
+    text = VALID.replace('"Tofu scramble"}', '"Tofu scramble",\n}').replace("}]}", "},\n]}")
+    assert parse_modification_response(text).modifications == EXPECTED
+
+
+def test_chunk_by_chunk_feeding_stops_at_closing_brace():
+    parser = ModificationStreamParser()
+    text = f"```json\n{VALID}\n```\nTrailing prose that never needs to arrive."
+    closed_at = None
+    for i, char in enumerate(text):
+        if parser.feed(char):
+            closed_at = i
+            break
+    assert closed_at == text.index(VALID) + len(VALID) - 1
+    assert parser.done
+    assert parser.close().modifications == EXPECTED
+
+
+def test_chunked_feeding_resumes_after_failed_candidate():
+    parser = ModificationStreamParser()
+    text = f"Use {{day}} names. {VALID}"
+    for i in range(0, len(text), 7):
+        parser.feed(text[i:i + 7])
+    assert parser.close().modifications == EXPECTED
+
+
+def test_single_modification_object_is_wrapped_in_a_list():
+    text = VALID.replace('"modifications": [', '"modifications": ').replace("}]}", "}}")
+    assert parse_modification_response(text).modifications == EXPECTED
+
+
+def test_unknown_target_falls_back_to_general():
+    text = VALID.replace('"target": "meal"', '"target": "week"')
+    assert parse_modification_response(text).modifications[0].target == "general"
+
+
+@pytest.mark.parametrize("text, message", [
+    ("No JSON here.", "No JSON object found"),
+    (VALID[:40], "ended before the JSON object was complete"),
+    (VALID.replace("modify_plan", "delete_plan"), "Unrecognized action"),
+    (VALID.replace('"nutrition"', '"sleep"'), "Unrecognized plan_type"),
+    (VALID.replace('"replace"', '"explode"'), "Unrecognized change_type"),
+    (VALID.replace('"modifications": [', '"modifications": [], "x": ['), "no modifications"),
+])
+def test_errors(text, message):
+    with pytest.raises(ModificationParseError, match=message):
+        parse_modification_response(text)
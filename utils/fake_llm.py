@@ -0,0 +1,124 @@
+"""
+Local fake chat model for load testing the planner without network calls
+"""
+from collections import Counter
+from dataclasses import dataclass
+import json
+import random
+import threading
+import time
+
+FAKE_WORKOUT_PLAN = """**Monday: Full Body**
+Warm-up: 5 minutes of jumping jacks
+- Push-ups: 3 sets of 10-12 reps
+- Squats: 3 sets of 12-15 reps
+- Plank: 3 sets of 30 seconds
+Cool-down: 5 minutes of stretching
+
+**Wednesday: Upper Body**
+- Dumbbell Rows: 3 sets of 12 reps
+- Shoulder Press: 3 sets of 10 reps
+
+**Friday: Lower Body**
+- Lunges: 3 sets of 10 reps each leg
+- Glute Bridges: 3 sets of 15 reps"""
+
+FAKE_NUTRITION_PLAN = """**Breakfast**: Oatmeal with banana and nuts (400 calories, 12g protein)
+**Lunch**: Quinoa bowl with roasted vegetables (450 calories, 15g protein)
+**Dinner**: Tofu stir-fry with brown rice (500 calories, 25g protein)
+**Snack**: Greek yogurt with berries (200 calories, 15g protein)"""
+
+FAKE_SCHEDULE = "\n".join(
+    f"**{day}**: {activity}. Meals: Oatmeal, Quinoa bowl, Tofu stir-fry."
+    for day, activity in [
+        ("Monday", "Full Body workout"), ("Tuesday", "Rest"), ("Wednesday", "Upper Body workout"),
+        ("Thursday", "Rest"), ("Friday", "Lower Body workout"), ("Saturday", "Rest"), ("Sunday", "Rest"),
+    ]
+)
+
+FAKE_MODIFICATION = {
+    "action": "modify_plan",
+    "plan_type": "nutrition",
+    "modifications": [{
+        "target": "meal",
+        "value": "Oatmeal",
+        "change_type": "replace",
+        "details": "**Breakfast**: Scrambled tofu with spinach and whole-wheat toast"
+    }]
+}
+
+
+class FakeLLMError(RuntimeError):
+    """Injected upstream failure"""
+
+
+@dataclass
+class FakeResponse:
+    content: str
+
+
+class FakeChatModel:
+    """Drop-in for the chat models used by ModelRouter: `invoke` and `stream`"""
+
+    def __init__(self, factory, model, json_mode):
+        self.factory = factory
+        self.model = model
+        self.json_mode = json_mode
+
+    def _respond(self, prompt) -> str:
+        if self.json_mode:
+            return json.dumps(FAKE_MODIFICATION, indent=2)
+        # Plan prompts are strings; chat sends a list of messages
+        if isinstance(prompt, str):
+            if "personalized workout plan" in prompt:
+                return FAKE_WORKOUT_PLAN
+            if "personalized nutrition plan" in prompt:
+                return FAKE_NUTRITION_PLAN
+            if "weekly schedule" in prompt:
+                return FAKE_SCHEDULE
+        return "Stick to your plan: Monday is a full body day and breakfast is oatmeal."
+
+    def invoke(self, prompt) -> FakeResponse:
+        self.factory.call(self.model)
+        return FakeResponse(self._respond(prompt))
+
+    def stream(self, prompt):
+        self.factory.call(self.model)
+        content = self._respond(prompt)
+        for i in range(0, len(content), 32):
+            yield FakeResponse(content[i:i + 32])
+
+
+class FakeLLMFactory:
+    """
+    `llm_factory` for ModelRouter that builds FakeChatModels.
+
+    Every upstream call sleeps for `latency` +/- `jitter` seconds (per-model
+    overrides via `model_latency`) and fails with probability `error_rate`.
+    Call counts are kept per model.
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, error_rate=0.0, model_latency=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.model_latency = model_latency or {}
+        self.calls = Counter()
+        self.errors = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, model, temperature, json_mode, **kwargs) -> FakeChatModel:
+        return FakeChatModel(self, model, json_mode)
+
+    def call(self, model):
+        """Simulate one upstream round trip, raising on an injected error"""
+        with self._lock:
+            self.calls[model] += 1
+            delay = max(0.0, self.model_latency.get(model, self.latency) + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors[model] += 1
+        time.sleep(delay)
+        if fail:
+            raise FakeLLMError(f"Injected upstream error from {model}")
@@ -0,0 +1,328 @@
+"""
+Concurrent-session load generator and trace replay for the planner layer
+
+Runs simulated users against FitnessPlanner and the app helpers with a local
+fake LLM (utils/fake_llm.py), then reports throughput, tail latency, upstream
+call counts and memory over time.
+
+Usage:
+    python -m utils.load_test --users 50 --latency 0.5 --jitter 0.2 --error-rate 0.02
+    python -m utils.load_test --trace data/traces/sample_trace.jsonl --speed 10
+
+Trace files are JSONL, one action per line:
+    {"user": "u1", "at": 0.0, "action": "generate_plan", "profile": {...}}
+    {"user": "u1", "at": 4.5, "action": "chat", "message": "What's for lunch?"}
+`at` is seconds since the start of the trace; each user's actions run in order.
+Actions: generate_plan, view_schedule, chat, modify, download_pdf.
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+from config import CHAT_CONTEXT_TURNS, PDF_CACHE_MAX_ENTRIES
+from agents.planner import CHAT_ERROR_MESSAGE, MODIFICATION_ERROR_MESSAGE, FitnessPlanner
+from agents.model_router import ModelRouter
+from agents.modifications import ModificationRequest, apply_plan_modifications
+from utils.fake_llm import FakeLLMFactory
+from utils.pdf_generator import create_fitness_plan_pdf
+from utils.plan_cache import ROOT_DIR
+from utils.session_memory import ChatHistory
+
+ACTIONS = ["generate_plan", "view_schedule", "chat", "modify", "download_pdf"]
+
+DEFAULT_PROFILE = {
+    "age": 30, "gender": "Male", "weight": 70.0, "height": 170,
+    "activity_level": "Moderately Active", "goal": "Build Muscle", "preferences": [],
+}
+
+# A typical session: plan, a look at the schedule, a few questions, one edit, PDF
+DEFAULT_FLOW = [
+    {"action": "generate_plan"},
+    {"action": "view_schedule"},
+    {"action": "chat", "message": "What should I eat before my Monday workout?"},
+    {"action": "chat", "message": "How long should I rest between sets?"},
+    {"action": "chat", "message": "Is it okay to walk on rest days?"},
+    {"action": "modify", "message": "Please replace the oatmeal in my breakfast."},
+    {"action": "download_pdf"},
+]
+
+
+@lru_cache(maxsize=PDF_CACHE_MAX_ENTRIES)
+def _plan_pdf(workout_plan, nutrition_plan, weekly_schedule):
+    # Mirrors the bounded st.cache_data PDF cache in app.py
+    return create_fitness_plan_pdf(workout_plan, nutrition_plan, weekly_schedule)
+
+
+class SimulatedSession:
+    """Per-user state the app keeps in st.session_state"""
+
+    def __init__(self, planner: FitnessPlanner, profile: Dict):
+        self.planner = planner
+        self.profile = profile
+        self.chat_history = ChatHistory()
+        self.workout_plan = None
+        self.nutrition_plan = None
+        self.weekly_schedule = None
+
+    def run(self, event) -> bool:
+        """Perform one action; returns False if the app would have shown an error"""
+        action = event["action"]
+        if action == "generate_plan":
+            self.profile = {**self.profile, **event.get("profile", {})}
+            workout_plan, nutrition_plan = self.planner.generate_plan(**self.profile)
+            if "Error" in workout_plan or "Error" in nutrition_plan:
+                return False
+            self.workout_plan, self.nutrition_plan = workout_plan, nutrition_plan
+            weekly_schedule = self.planner.generate_weekly_schedule(workout_plan, nutrition_plan)
+            if "Error" in weekly_schedule:
+                return False
+            self.weekly_schedule = weekly_schedule
+            return True
+        if action == "view_schedule":
+            return bool(self.weekly_schedule)
+        if action in ("chat", "modify"):
+            message = event.get("message", "")
+            self.chat_history.append({"role": "user", "content": message})
+            context = {
+                "workout_plan": self.workout_plan or "Not yet generated.",
+                "nutrition_plan": self.nutrition_plan or "Not yet generated.",
+                "weekly_schedule": self.weekly_schedule or "Not yet generated.",
+            }
+            response = self.planner.chat_response(message, self.chat_history.last(CHAT_CONTEXT_TURNS), context)
+            if isinstance(response, ModificationRequest):
+                (self.workout_plan, self.nutrition_plan, self.weekly_schedule, response) = apply_plan_modifications(
+                    response, self.workout_plan or "", self.nutrition_plan or "", self.weekly_schedule or ""
+                )
+            elif action == "modify" or response in (CHAT_ERROR_MESSAGE, MODIFICATION_ERROR_MESSAGE):
+                return False
+            self.chat_history.append({"role": "assistant", "content": response})
+            return True
+        if action == "download_pdf":
+            if not self.workout_plan:
+                return False
+            return bool(_plan_pdf(self.workout_plan, self.nutrition_plan, self.weekly_schedule))
+        raise ValueError(f"Unknown action: {action}")
+
+
+class MemorySampler(threading.Thread):
+    """Samples process RSS and traced Python allocations at a fixed interval"""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._start_time = time.monotonic()
+
+    @staticmethod
+    def rss_bytes():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return None
+
+    def sample(self):
+        traced, _ = tracemalloc.get_traced_memory()
+        self.samples.append((time.monotonic() - self._start_time, self.rss_bytes(), traced))
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+def load_trace(path) -> List[Dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_trace(users, think_time=2.0, ramp_up=5.0, seed=None) -> List[Dict]:
+    """Every user runs DEFAULT_FLOW, starting within the ramp-up window, with random think time"""
+    rng = random.Random(seed)
+    events = []
+    for user in range(users):
+        at = rng.uniform(0, ramp_up)
+        for step in DEFAULT_FLOW:
+            events.append({"user": f"user-{user}", "at": round(at, 3), **step})
+            at += rng.expovariate(1 / think_time) if think_time > 0 else 0
+    return events
+
+
+def replay(events, planner: FitnessPlanner, speed=1.0, max_concurrency=None, sample_interval=1.0) -> Dict:
+    """Replay events with one thread per user and collect latency and memory results"""
+    by_user = defaultdict(list)
+    for event in events:
+        by_user[event.get("user", "anonymous")].append(event)
+    for user_events in by_user.values():
+        user_events.sort(key=lambda event: event.get("at", 0))
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    # Exceptions escaping SimulatedSession.run are harness bugs, not app errors
+    exceptions = Counter()
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def run_user(user_events):
+        session = SimulatedSession(planner, dict(DEFAULT_PROFILE))
+        for event in user_events:
+            delay = start + event.get("at", 0) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            action_start = time.monotonic()
+            exception = None
+            try:
+                ok = session.run(event)
+            except Exception as e:
+                logging.exception(f"Load test action {event.get('action')} raised {type(e).__name__}")
+                exception = type(e).__name__
+            elapsed = time.monotonic() - action_start
+            with lock:
+                if exception is not None:
+                    exceptions[exception] += 1
+                    continue
+                latencies[event["action"]].append(elapsed)
+                if not ok:
+                    errors[event["action"]] += 1
+
+    tracemalloc.start()
+    sampler = MemorySampler(sample_interval)
+    sampler.start()
+    with ThreadPoolExecutor(max_workers=max_concurrency or max(1, len(by_user))) as executor:
+        list(executor.map(run_user, by_user.values()))
+    sampler.stop()
+    tracemalloc.stop()
+
+    return {
+        "duration": time.monotonic() - start,
+        "users": len(by_user),
+        "latencies": dict(latencies),
+        "errors": dict(errors),
+        "exceptions": dict(exceptions),
+        "memory": sampler.samples,
+    }
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def summarize(results, llm_factory: FakeLLMFactory, router: ModelRouter) -> Dict:
+    actions = {}
+    for action, values in results["latencies"].items():
+        actions[action] = {
+            "count": len(values),
+            "errors": results["errors"].get(action, 0),
+            "p50": round(_percentile(values, 50), 3),
+            "p95": round(_percentile(values, 95), 3),
+            "p99": round(_percentile(values, 99), 3),
+            "max": round(max(values), 3),
+        }
+    total = sum(stats["count"] for stats in actions.values())
+    return {
+        "users": results["users"],
+        "duration": round(results["duration"], 2),
+        "actions": total,
+        "throughput": round(total / results["duration"], 2) if results["duration"] else 0.0,
+        "per_action": actions,
+        "exceptions": results["exceptions"],
+        "upstream_calls": dict(llm_factory.calls),
+        "upstream_errors": dict(llm_factory.errors),
+        "router": router.stats(),
+        "memory": [
+            {"elapsed": round(elapsed, 2), "rss_mb": round(rss / 2 ** 20, 1) if rss else None,
+             "traced_mb": round(traced / 2 ** 20, 2)}
+            for elapsed, rss, traced in results["memory"]
+        ],
+    }
+
+
+def format_report(summary) -> str:
+    lines = [
+        f"{summary['users']} users, {summary['actions']} actions in {summary['duration']}s "
+        f"({summary['throughput']} actions/s)",
+        "",
+        f"{'action':<15}{'count':>7}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+    ]
+    for action in ACTIONS:
+        stats = summary["per_action"].get(action)
+        if stats:
+            lines.append(
+                f"{action:<15}{stats['count']:>7}{stats['errors']:>8}"
+                f"{stats['p50']:>9}{stats['p95']:>9}{stats['p99']:>9}{stats['max']:>9}"
+            )
+    if summary["exceptions"]:
+        lines.append("Harness exceptions (not counted above): " + ", ".join(
+            f"{name}={count}" for name, count in summary["exceptions"].items()
+        ))
+    lines.append("")
+    lines.append("Upstream calls: " + ", ".join(
+        f"{model}={count} ({summary['upstream_errors'].get(model, 0)} errors)"
+        for model, count in summary["upstream_calls"].items()
+    ))
+    for tier, stats in summary["router"].items():
+        if isinstance(stats, dict):
+            lines.append(
+                f"Router tier {tier}: calls={stats['calls']} failures={stats['failures']} "
+                f"p95={stats['p95_latency']}s degraded={stats['degraded']}"
+            )
+    lines.append(f"Local template fallbacks: {summary['router']['local_fallbacks']}")
+    lines.append("")
+    lines.append("Memory over time (elapsed s, RSS MB, traced MB):")
+    memory = summary["memory"]
+    step = max(1, len(memory) // 10)
+    for sample in memory[::step] + ([memory[-1]] if memory and (len(memory) - 1) % step else []):
+        lines.append(f"  {sample['elapsed']:>7}  {sample['rss_mb']}  {sample['traced_mb']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the planner layer with a fake LLM.")
+    parser.add_argument("--users", type=int, default=20, help="Simulated concurrent users (ignored with --trace)")
+    parser.add_argument("--trace", help="JSONL trace to replay instead of the synthetic flow")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier for trace timestamps")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Mean think time between synthetic actions (s)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Window over which synthetic users start (s)")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Cap on users running at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Fake LLM latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake LLM error probability per call")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for the trace and fake LLM")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="Memory sampling interval (s)")
+    parser.add_argument("--json-out", help="Also write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    llm_factory = FakeLLMFactory(args.latency, args.jitter, args.error_rate, seed=args.seed)
+    router = ModelRouter(llm_factory)
+    planner = FitnessPlanner(google_api_key=None, router=router)
+
+    if args.trace:
+        events = load_trace(ROOT_DIR / args.trace)
+    else:
+        events = synthetic_trace(args.users, args.think_time, args.ramp_up, args.seed)
+
+    results = replay(events, planner, args.speed, args.max_concurrency, args.sample_interval)
+    summary = summarize(results, llm_factory, router)
+    print(format_report(summary))
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
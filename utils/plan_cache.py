@@ -0,0 +1,99 @@
+"""
+Persistent cache of generated plans keyed by profile bucket
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+import sqlite3
+import threading
+import time
+
+from config import PLAN_CACHE_PATH, AGE_BANDS
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def age_band(age) -> str:
+    """Map an age to its configured band label, e.g. 30 -> '25-34'"""
+    low, high = AGE_BANDS[-1] if age > AGE_BANDS[-1][1] else AGE_BANDS[0]
+    for band_low, band_high in AGE_BANDS:
+        if band_low <= age <= band_high:
+            low, high = band_low, band_high
+            break
+    return f"{low}-{high}"
+
+
+def profile_bucket(age, gender, activity_level, goal, preferences: List[str]) -> str:
+    """
+    Bucket key for the sidebar selectbox combination.
+    Weight and height are deliberately excluded, so a cached plan was generated
+    for a representative profile of the bucket rather than the exact user.
+    """
+    return "|".join([age_band(age), gender, activity_level, goal, ",".join(sorted(preferences))])
+
+
+@dataclass
+class CachedPlan:
+    bucket: str
+    workout_plan: str
+    nutrition_plan: str
+    weekly_schedule: str
+    pdf: Optional[bytes]
+    created_at: float
+
+
+class PlanCache:
+    """SQLite-backed plan store shared by the app and the cache warmer"""
+
+    def __init__(self, path=PLAN_CACHE_PATH):
+        self.path = ROOT_DIR / path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS plans (
+                    bucket TEXT PRIMARY KEY,
+                    workout_plan TEXT NOT NULL,
+                    nutrition_plan TEXT NOT NULL,
+                    weekly_schedule TEXT NOT NULL,
+                    pdf BLOB,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps the store safe to share across threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, bucket) -> Optional[CachedPlan]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT bucket, workout_plan, nutrition_plan, weekly_schedule, pdf, created_at "
+                "FROM plans WHERE bucket = ?",
+                (bucket,)
+            ).fetchone()
+        return CachedPlan(*row) if row else None
+
+    def put(self, bucket, workout_plan, nutrition_plan, weekly_schedule, pdf=None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?)",
+                (bucket, workout_plan, nutrition_plan, weekly_schedule, pdf, time.time())
+            )
+
+    def __contains__(self, bucket) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM plans WHERE bucket = ?", (bucket,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
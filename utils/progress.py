@@ -0,0 +1,230 @@
+"""
+Daily check-ins and adaptive TDEE estimation
+
+Each user's check-ins are appended to a compact binary file of fixed-width
+records (one per check-in), while rolling statistics are kept in a small JSON file and updated in
+O(1) per check-in. History is never rescanned to compute the current state.
+"""
+from array import array
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, Optional
+import hashlib
+import json
+import os
+import struct
+import threading
+
+from config import (
+    PROGRESS_DIR, TREND_SMOOTHING, KCAL_PER_KG, REPLAN_DRIFT_THRESHOLD,
+    REPLAN_MIN_CHECK_INS, REPLAN_COOLDOWN_DAYS, DEFAULT_WORKOUT_DAYS
+)
+from agents.template_plans import is_template_plan
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# field name -> array typecode, in record order
+SERIES = {
+    "day": "i",        # date ordinal
+    "weight": "f",     # kg
+    "calories": "f",   # kcal eaten
+    "workouts": "B",   # workouts completed that day
+}
+# One check-in per record, written in a single call so the fields can't drift apart
+RECORD = struct.Struct("<" + "".join(SERIES.values()))
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _user_lock(user_id) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(user_id, threading.Lock())
+
+
+@dataclass
+class ProgressStats:
+    count: int = 0
+    first_day: Optional[int] = None
+    last_day: Optional[int] = None
+    trend_weight: Optional[float] = None
+    weight_slope: float = 0.0  # kg per day, from the smoothed trend
+    intake_avg: Optional[float] = None
+    workouts_per_week: float = 0.0
+    planned_workouts_per_week: int = len(DEFAULT_WORKOUT_DAYS)
+    planned_tdee: Optional[float] = None
+    last_replan_day: Optional[int] = None
+    # Stats as they were before the latest check-in, so a same-day correction stays O(1)
+    previous: Optional[Dict] = field(default=None, repr=False)
+
+    @property
+    def estimated_tdee(self) -> Optional[float]:
+        """Intake minus the energy stored (or released) by the weight trend"""
+        if self.intake_avg is None:
+            return None
+        return self.intake_avg - self.weight_slope * KCAL_PER_KG
+
+    @property
+    def adherence(self) -> float:
+        if not self.planned_workouts_per_week:
+            return 1.0
+        return min(1.0, self.workouts_per_week / self.planned_workouts_per_week)
+
+    @property
+    def tdee_drift(self) -> Optional[float]:
+        """Relative gap between the estimated and the planned TDEE"""
+        if self.planned_tdee is None or self.estimated_tdee is None:
+            return None
+        return (self.estimated_tdee - self.planned_tdee) / self.planned_tdee
+
+    def update(self, day, weight, calories, workouts):
+        """Fold one check-in into the rolling statistics"""
+        if self.count == 0:
+            self.first_day = day
+            self.trend_weight = weight
+            self.intake_avg = calories
+            # Assume the plan is being followed until check-ins say otherwise
+            self.workouts_per_week = float(self.planned_workouts_per_week)
+        else:
+            gap = max(1, day - self.last_day)
+            # Smoothing factor compounded over missed days
+            alpha = 1 - (1 - TREND_SMOOTHING) ** gap
+            trend = self.trend_weight + alpha * (weight - self.trend_weight)
+            self.weight_slope += alpha * ((trend - self.trend_weight) / gap - self.weight_slope)
+            self.trend_weight = trend
+            self.intake_avg += alpha * (calories - self.intake_avg)
+            self.workouts_per_week += alpha * (workouts * 7 / gap - self.workouts_per_week)
+        self.count += 1
+        self.last_day = day
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ProgressLog:
+    """Array-backed check-in history and rolling stats for one user"""
+
+    def __init__(self, user_id, base_dir=PROGRESS_DIR):
+        self.user_id = user_id.strip() or "default"
+        # Hash the name so distinct names never share a directory
+        directory = hashlib.sha256(self.user_id.encode("utf-8")).hexdigest()
+        self.path = ROOT_DIR / base_dir / directory
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._stats_path = self.path / "stats.json"
+        self._records_path = self.path / "checkins.bin"
+        self._lock = _user_lock(directory)
+        self.stats = self._load_stats()
+
+    def _load_stats(self) -> ProgressStats:
+        if not self._stats_path.exists():
+            return ProgressStats()
+        with open(self._stats_path) as f:
+            return ProgressStats(**json.load(f))
+
+    def _save_stats(self):
+        tmp_path = self._stats_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.stats.to_dict(), f)
+        tmp_path.replace(self._stats_path)
+
+    def _write_record(self, values, index):
+        """Write check-in number `index` (0-based), dropping anything after it"""
+        record = RECORD.pack(*(values[name] for name in SERIES))
+        fd = os.open(self._records_path, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+b") as f:
+            # stats.json is the source of truth: a torn record or one whose stats
+            # were never saved (a failed earlier write) is cut off here
+            f.truncate(index * RECORD.size)
+            f.seek(index * RECORD.size)
+            f.write(record)
+
+    def check_in(self, day, weight, calories, workouts=0) -> ProgressStats:
+        """
+        Record a check-in for `day` (a date ordinal). A second check-in on the
+        same day replaces the first one.
+        """
+        with self._lock:
+            # Another session may have checked in since this log was opened
+            self.stats = self._load_stats()
+            stats = self.stats
+            if stats.last_day is not None and day < stats.last_day:
+                raise ValueError("Check-ins must be recorded in date order.")
+            overwrite_last = day == stats.last_day
+            index = stats.count - 1 if overwrite_last else stats.count
+            if overwrite_last:
+                snapshot = stats.previous
+                stats = ProgressStats(**snapshot)
+                stats.previous = snapshot
+                # Plan settings may have changed since the snapshot was taken
+                stats.planned_tdee = self.stats.planned_tdee
+                stats.planned_workouts_per_week = self.stats.planned_workouts_per_week
+                stats.last_replan_day = self.stats.last_replan_day
+            else:
+                stats.previous = None
+                stats.previous = stats.to_dict()
+            stats.update(day, float(weight), float(calories), int(workouts))
+            self._write_record(
+                {"day": day, "weight": weight, "calories": calories, "workouts": min(int(workouts), 255)},
+                index
+            )
+            self.stats = stats
+            self._save_stats()
+            return stats
+
+    def set_plan(self, planned_tdee, day=None, planned_workouts_per_week=None):
+        """Record the TDEE (and optionally workouts/week) the current plan is built on"""
+        with self._lock:
+            self.stats = self._load_stats()
+            self.stats.planned_tdee = float(planned_tdee)
+            if day is not None:
+                self.stats.last_replan_day = day
+            if planned_workouts_per_week is not None:
+                self.stats.planned_workouts_per_week = planned_workouts_per_week
+            self._save_stats()
+
+    def load_series(self, name, last_n=None) -> array:
+        """Read one series, optionally only its last `last_n` entries"""
+        series = array(SERIES[name])
+        if not self._records_path.exists():
+            return series
+        # Only records covered by the saved stats count; see _write_record
+        total = self.stats.count
+        count = total if last_n is None else min(last_n, total)
+        field_index = list(SERIES).index(name)
+        with open(self._records_path, "rb") as f:
+            f.seek((total - count) * RECORD.size)
+            data = f.read(count * RECORD.size)
+        data = data[:len(data) - len(data) % RECORD.size]
+        series.extend(values[field_index] for values in RECORD.iter_unpack(data))
+        return series
+
+    def needs_replan(self, day) -> bool:
+        """True once the estimated TDEE has drifted past the threshold from the planned one"""
+        stats = self.stats
+        drift = stats.tdee_drift
+        if drift is None or stats.count < REPLAN_MIN_CHECK_INS:
+            return False
+        if stats.last_replan_day is not None and day - stats.last_replan_day < REPLAN_COOLDOWN_DAYS:
+            return False
+        return abs(drift) > REPLAN_DRIFT_THRESHOLD
+
+    def maybe_replan(self, planner, day, age, gender, height, activity_level, goal, preferences):
+        """
+        Regenerate plans through FitnessPlanner using the trend weight and the
+        estimated TDEE, but only when the drift check passes.
+        Returns (workout_plan, nutrition_plan) or None.
+        """
+        if not self.needs_replan(day):
+            return None
+        estimated_tdee = self.stats.estimated_tdee
+        workout_plan, nutrition_plan = planner.generate_plan(
+            age, gender, round(self.stats.trend_weight, 1), height, activity_level, goal, preferences,
+            tdee=estimated_tdee
+        )
+        if "Error" in workout_plan or "Error" in nutrition_plan:
+            return None
+        if is_template_plan(workout_plan, nutrition_plan):
+            # Don't replace a personalized plan with a generic one
+            return None
+        self.set_plan(estimated_tdee, day=day)
+        return workout_plan, nutrition_plan
@@ -0,0 +1,178 @@
+"""
+Bounded per-session chat history
+
+Only the most recent turns are kept in memory. Older turns are spilled to an
+append-only JSONL file per session and read back from the end of the file only
+when the user pages to them, so an idle session's footprint stays flat however
+long the conversation gets.
+"""
+from collections import deque
+from pathlib import Path
+from typing import Dict, List
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+from config import (
+    CHAT_MEMORY_TURNS, CHAT_SPILL_DIR, CHAT_SPILL_MAX_AGE_SECONDS, CHAT_SPILL_PRUNE_INTERVAL_SECONDS
+)
+
+_READ_BLOCK_SIZE = 64 * 1024
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def spill_dir() -> Path:
+    """Private spill directory: the files hold users' chat content"""
+    path = Path(tempfile.gettempdir()) / CHAT_SPILL_DIR
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # mkdir's mode is ignored if the directory already existed
+    os.chmod(path, 0o700)
+    return path
+
+
+def prune_spill_files(max_age_seconds=CHAT_SPILL_MAX_AGE_SECONDS) -> int:
+    """Delete spill files of sessions that have been idle longer than `max_age_seconds`"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for spill_file in spill_dir().glob("*.jsonl"):
+        try:
+            if spill_file.stat().st_mtime < cutoff:
+                spill_file.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _maybe_prune():
+    """Prune at most once per CHAT_SPILL_PRUNE_INTERVAL_SECONDS across all sessions"""
+    global _last_prune
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune and now - _last_prune < CHAT_SPILL_PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    prune_spill_files()
+
+
+def _remove_spill_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class ChatHistory:
+    """Ring buffer of recent chat messages backed by an on-disk spill file"""
+
+    def __init__(self, max_in_memory=CHAT_MEMORY_TURNS):
+        _maybe_prune()
+        self.recent = deque(maxlen=max_in_memory)
+        self.spill_path = spill_dir() / f"{uuid.uuid4().hex}.jsonl"
+        self.spilled = 0
+        self._spill_size = 0
+        # Delete the spill file when the session's history is garbage collected
+        weakref.finalize(self, _remove_spill_file, str(self.spill_path))
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.recent)
+
+    def append(self, message: Dict):
+        if len(self.recent) == self.recent.maxlen:
+            self._spill(self.recent[0])
+        self.recent.append(message)
+
+    def _spill(self, message):
+        line = (json.dumps(message) + "\n").encode("utf-8")
+        try:
+            fd = os.open(self.spill_path, os.O_WRONLY | os.O_APPEND)
+        except FileNotFoundError:
+            # First spill, or the file was pruned while the session sat idle:
+            # anything counted as spilled before is gone
+            self.spilled = 0
+            self._spill_size = 0
+            fd = os.open(self.spill_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "ab") as f:
+            f.write(line)
+        self.spilled += 1
+        self._spill_size += len(line)
+
+    def _read_spilled_tail(self, count, skip=0) -> List[Dict]:
+        """
+        Read `count` spilled messages ending `skip` messages before the end of
+        the file, scanning back from the end
+        """
+        if count <= 0:
+            return []
+        try:
+            with open(self.spill_path, "rb") as f:
+                position = f.seek(0, 2)
+                data = b""
+                # One extra newline guarantees the lines wanted are complete
+                while position > 0 and data.count(b"\n") <= count + skip:
+                    step = min(_READ_BLOCK_SIZE, position)
+                    position -= step
+                    f.seek(position)
+                    data = f.read(step) + data
+        except FileNotFoundError:
+            # Pruned after a long idle period; older history is gone
+            self.spilled = 0
+            self._spill_size = 0
+            return []
+        lines = data.splitlines()
+        lines = lines[max(0, len(lines) - count - skip):len(lines) - skip]
+        return [json.loads(line) for line in lines]
+
+    def window(self, count, skip=0) -> List[Dict]:
+        """
+        `count` messages ending `skip` messages before the newest, oldest first,
+        reading spilled ones from disk if needed
+        """
+        stop = max(0, len(self) - skip)
+        start = max(0, stop - count)
+        # Indexes relative to the in-memory buffer; negative ones are on disk
+        recent_start = start - self.spilled
+        recent_stop = stop - self.spilled
+        older = []
+        if recent_start < 0:
+            older = self._read_spilled_tail(min(recent_stop, 0) - recent_start, skip=max(-recent_stop, 0))
+        return older + list(self.recent)[max(recent_start, 0):max(recent_stop, 0)]
+
+    def last(self, count) -> List[Dict]:
+        """The most recent `count` messages, oldest first"""
+        return self.window(count)
+
+    def page_count(self, page_size) -> int:
+        return max(1, -(-len(self) // page_size))
+
+    def page(self, index, page_size) -> List[Dict]:
+        """Page `index` of the history, counting back from 0 for the newest page"""
+        return self.window(page_size, skip=index * page_size)
+
+    def memory_report(self) -> Dict:
+        """Approximate in-memory and on-disk footprint of this history"""
+        in_memory_bytes = sys.getsizeof(self.recent) + sum(
+            sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+            for message in self.recent
+        )
+        return {
+            "messages_in_memory": len(self.recent),
+            "messages_on_disk": self.spilled,
+            "in_memory_bytes": in_memory_bytes,
+            "on_disk_bytes": self._spill_size,
+        }
+
+
+def session_memory_report(history: ChatHistory, plans: Dict[str, str]) -> Dict:
+    """Per-session memory report: chat history plus the plan strings held in session state"""
+    report = history.memory_report()
+    report["plan_bytes"] = sum(sys.getsizeof(plan) for plan in plans.values() if plan)
+    report["total_in_memory_bytes"] = report["in_memory_bytes"] + report["plan_bytes"]
+    return report